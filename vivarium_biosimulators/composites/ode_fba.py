@@ -8,12 +8,18 @@ and wires them together so that the ODE model's flux outputs are used to constra
 model's flux bound inputs.
 """
 
+import json
+
 from vivarium.core.composer import Composer
 from vivarium_biosimulators.processes.biosimulator_process import Biosimulator
 from vivarium_biosimulators.library.mappings import remove_multi_update
 from vivarium_biosimulators.processes.flux_bounds import FluxBoundsConverter, get_flux_and_bound_ids
 
 
+def get_generate_key(config):
+    return json.dumps(config, sort_keys=True, default=str)
+
+
 class ODE_FBA(Composer):
     """ Generates an ODE/FBA Composite
 
@@ -30,6 +36,10 @@ class ODE_FBA(Composer):
             port mapping is not declared by ode_topology or fba_topology.
         - flux_unit (str): The unit of the ode process' flux output.
         - bounds_unit (str): The unit of the fba process' flux bounds input.
+        - concurrent (bool): run the ode and fba processes concurrently, each in a worker subprocess.
+            The fba process runs as a process on the ode's time step, using the bounds from the
+            start of each time step, rather than as a step after the ode. The fba's time step is the
+            ode's 'time_step', so it can not be combined with the ode's 'adaptive_time_step'.
     """
     defaults = {
         'ode_config': None,
@@ -38,6 +48,7 @@ class ODE_FBA(Composer):
         'default_store_name': 'state',
         'flux_unit': 'mol/L',
         'bounds_unit': 'mmol/L/s',
+        'concurrent': False,
     }
 
     def __init__(self, config=None):
@@ -46,10 +57,27 @@ class ODE_FBA(Composer):
         self.flux_ids, self.bounds_ids = get_flux_and_bound_ids(self.flux_to_bounds_map)
         self.default_store = self.config['default_store_name']
 
+        # the composite made for initial_state, which is reused by the next generate
+        self.initial_state_composite = None
+
     def initial_state(self, config=None):
-        initial_state = super().initial_state(config)
+        composite = self.generate(config)
+        self.initial_state_composite = (get_generate_key(config), composite)
+        initial_state = composite.initial_state(config)
         return remove_multi_update(initial_state)
 
+    def generate(self, config=None, path=()):
+        """
+        generate the composite, reusing the one made by initial_state with the same config,
+        so that the biosimulators are not built and initialized twice
+        """
+        if self.initial_state_composite is not None and path == ():
+            key, composite = self.initial_state_composite
+            self.initial_state_composite = None
+            if key == get_generate_key(config):
+                return composite
+        return super().generate(config, path)
+
     def generate_processes(self, config):
         """
         generate the fba process, ode process, and ode flux to bounds converter process.
@@ -61,7 +89,6 @@ class ODE_FBA(Composer):
             'emit_ports': ['outputs', 'bounds'],
             **config['fba_config'],
         }
-        fba_process = Biosimulator(fba_full_config)
 
         # make the ode process, and fluxes port
         ode_full_config = {
@@ -69,6 +96,21 @@ class ODE_FBA(Composer):
             'emit_ports': ['outputs', 'fluxes'],
             **config['ode_config'],
         }
+
+        # workers solve the ode and fba in parallel
+        if config['concurrent']:
+            if ode_full_config.get('adaptive_time_step'):
+                raise ValueError(
+                    "concurrent ODE_FBA runs the fba on the ode's time_step, "
+                    "which does not follow the ode's adaptive_time_step")
+            ode_full_config['worker'] = True
+            fba_full_config.update({
+                'worker': True,
+                'run_as_process': True,
+                'time_step': ode_full_config.get('time_step', Biosimulator.defaults['time_step']),
+            })
+
+        fba_process = Biosimulator(fba_full_config)
         ode_process = Biosimulator(ode_full_config)
 
         # make the ode flux bounds converter process,
@@ -0,0 +1,344 @@
+"""
+Benchmark Biosimulator startup and per-step latency
+===================================================
+
+Benchmarks Biosimulators over the bundled models and the ODE_FBA composite,
+and reports the biosimulator api's import time, construction time (with the
+parse and preprocess time recorded during construction), initial state time,
+per-step latency percentiles, steps per second, and peak RSS as JSON. For the
+ODE_FBA composite, the build time covers making the processes and the
+initial state.
+Each benchmark runs in its own subprocess, so that peak RSS is not shared.
+
+Execute by running::
+
+    python vivarium_biosimulators/experiments/benchmarks.py -o benchmarks.json
+    python vivarium_biosimulators/experiments/benchmarks.py -o new.json --compare benchmarks.json
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from biosimulators_utils.sedml.data_model import ModelLanguage
+from vivarium_biosimulators.models.model_paths import (
+    BIGG_iAF1260b_PATH, BIGG_ECOLI_CORE_PATH, KOTTE2010_PATH, MILLARD2016_PATH, CILIBERTO2003_PATH)
+from vivarium_biosimulators.library.workers import get_multiprocessing_context
+
+
+def tellurium_spec(model_source):
+    return {
+        'biosimulator_api': 'biosimulators_tellurium',
+        'model_source': model_source,
+        'model_language': ModelLanguage.SBML.value,
+        'simulation': 'uniform_time_course',
+    }
+
+
+def cobrapy_spec(model_source):
+    return {
+        'biosimulator_api': 'biosimulators_cobrapy',
+        'model_source': model_source,
+        'model_language': ModelLanguage.SBML.value,
+        'simulation': 'steady_state',
+        'algorithm': {
+            'kisao_id': 'KISAO_0000437',
+        },
+    }
+
+
+# {benchmark id: Biosimulator config}, 'ode_fba' benchmarks the ODE_FBA composite
+BENCHMARK_SPECS = {
+    'tellurium_kotte2010': tellurium_spec(KOTTE2010_PATH),
+    'tellurium_millard2016': tellurium_spec(MILLARD2016_PATH),
+    'tellurium_ciliberto2003': tellurium_spec(CILIBERTO2003_PATH),
+    'cobrapy_e_coli_core': cobrapy_spec(BIGG_ECOLI_CORE_PATH),
+    'cobrapy_iAF1260b': cobrapy_spec(BIGG_iAF1260b_PATH),
+    'ode_fba': None,
+}
+
+# metrics compared against a baseline, and whether higher values are better
+COMPARED_METRICS = {
+    'import_time': False,
+    'construction_time': False,
+    'parse_time': False,
+    'preprocess_time': False,
+    'initial_state_time': False,
+    'build_time': False,
+    'step_latency.p50': False,
+    'step_latency.p90': False,
+    'step_latency.p99': False,
+    'steps_per_sec': True,
+    'peak_rss_mb': False,
+}
+
+
+def get_peak_rss_mb():
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # bytes on macOS, kilobytes on linux
+        return peak_rss / 2 ** 20
+    return peak_rss / 2 ** 10
+
+
+def summarize_latencies(latencies):
+    latencies = np.array(latencies)
+    total_time = latencies.sum()
+    return {
+        'step_latency': {
+            'mean': float(latencies.mean()),
+            'p50': float(np.percentile(latencies, 50)),
+            'p90': float(np.percentile(latencies, 90)),
+            'p99': float(np.percentile(latencies, 99)),
+            'max': float(latencies.max()),
+        },
+        'steps_per_sec': float(len(latencies) / total_time) if total_time > 0 else None,
+    }
+
+
+def benchmark_biosimulator(config, n_steps=20, time_step=1.):
+    """ time a Biosimulator's construction, initial state, and next_update """
+    import importlib
+    from vivarium_biosimulators.processes.biosimulator_process import Biosimulator
+
+    # import the biosimulator api first, so that construction time does not include it
+    start = time.perf_counter()
+    importlib.import_module(config['biosimulator_api'])
+    import_time = time.perf_counter() - start
+
+    # the process's timer records the parse, preprocess, and initial state phases
+    start = time.perf_counter()
+    process = Biosimulator({**config, 'time_step': time_step, 'timing': True})
+    construction_time = time.perf_counter() - start
+    state = process.initial_state()
+    timings = process.get_timings()
+    process.reset_timings()
+
+    latencies = []
+    for _ in range(n_steps):
+        start = time.perf_counter()
+        update = process.next_update(time_step, state)
+        latencies.append(time.perf_counter() - start)
+        for port_id, port_update in update.items():
+            for variable_id, delta in port_update.items():
+                state[port_id][variable_id] += delta
+
+    return {
+        'import_time': import_time,
+        'construction_time': construction_time,
+        'parse_time': timings['parse']['time'],
+        'preprocess_time': timings['preprocess']['time'],
+        'initial_state_time': timings['initial_state']['time'],
+        **summarize_latencies(latencies),
+    }
+
+
+def benchmark_ode_fba(n_steps=20, time_step=1.):
+    """
+    time the ODE_FBA composite's build and engine steps. The build makes the processes
+    and the initial state, and generate then reuses the processes.
+    """
+    from vivarium.core.engine import Engine
+    from vivarium_biosimulators.composites.ode_fba import ODE_FBA
+    from vivarium_biosimulators.experiments.tellurium_cobra import FLUX_TO_BOUNDS_MAP
+
+    config = {
+        'ode_config': {**tellurium_spec(MILLARD2016_PATH), 'time_step': time_step},
+        'fba_config': cobrapy_spec(BIGG_ECOLI_CORE_PATH),
+        'flux_to_bounds_map': FLUX_TO_BOUNDS_MAP,
+        'flux_unit': 'mol/L',
+        'bounds_unit': 'mmol/g/hr',
+    }
+
+    # the initial state is made first, so that generate reuses its processes
+    start = time.perf_counter()
+    composer = ODE_FBA(config)
+    initial_state = composer.initial_state()
+    composite = composer.generate()
+    build_time = time.perf_counter() - start
+
+    engine = Engine(
+        processes=composite['processes'],
+        topology=composite['topology'],
+        initial_state=initial_state,
+        display_info=False,
+        emitter='null',
+    )
+    latencies = []
+    for _ in range(n_steps):
+        start = time.perf_counter()
+        engine.update(time_step)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        'build_time': build_time,
+        **summarize_latencies(latencies),
+    }
+
+
+def run_benchmark(benchmark_id, n_steps=20, time_step=1.):
+    """ run one benchmark, and return its results or its error """
+    import warnings; warnings.filterwarnings('ignore')
+    try:
+        config = BENCHMARK_SPECS[benchmark_id]
+        if config is None:
+            results = benchmark_ode_fba(n_steps, time_step)
+        else:
+            results = benchmark_biosimulator(config, n_steps, time_step)
+        results['n_steps'] = n_steps
+    except Exception:
+        results = {'error': traceback.format_exc()}
+    results['peak_rss_mb'] = get_peak_rss_mb()
+    return results
+
+
+def get_metadata():
+    from importlib.metadata import version, PackageNotFoundError
+    packages = {}
+    for package in [
+        'vivarium-core', 'biosimulators-utils', 'biosimulators-tellurium',
+        'biosimulators-cobrapy', 'libroadrunner', 'cobra', 'numpy',
+    ]:
+        try:
+            packages[package] = version(package)
+        except PackageNotFoundError:
+            packages[package] = None
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'packages': packages,
+    }
+
+
+def run_benchmarks(benchmark_ids=None, n_steps=20, time_step=1., isolate=True):
+    """
+    Run the benchmarks, each in a fresh subprocess if isolate is True.
+
+    Returns:
+        dict: {'metadata': {...}, 'benchmarks': {benchmark id: results}}
+    """
+    benchmark_ids = benchmark_ids or list(BENCHMARK_SPECS.keys())
+    benchmarks = {}
+    for benchmark_id in benchmark_ids:
+        print(f'BENCHMARK {benchmark_id}')
+        if isolate:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_multiprocessing_context()) as executor:
+                results = executor.submit(run_benchmark, benchmark_id, n_steps, time_step).result()
+        else:
+            results = run_benchmark(benchmark_id, n_steps, time_step)
+        benchmarks[benchmark_id] = results
+        if 'error' in results:
+            print(f'...ERROR\n{results["error"]}')
+    return {
+        'metadata': get_metadata(),
+        'benchmarks': benchmarks,
+    }
+
+
+def get_metric(results, metric):
+    value = results
+    for key in metric.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare_benchmarks(report, baseline, threshold=1.2):
+    """
+    Compare a benchmark report against a baseline report.
+
+    Args:
+        threshold (float): the ratio over the baseline (or under it, for steps_per_sec)
+            that counts as a regression.
+    Returns:
+        list: a dict for each compared metric, with keys 'benchmark', 'metric',
+            'baseline', 'value', 'ratio', and 'regression'.
+    """
+    comparisons = []
+    for benchmark_id, results in report['benchmarks'].items():
+        baseline_results = baseline['benchmarks'].get(benchmark_id)
+        if baseline_results is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            value = get_metric(results, metric)
+            baseline_value = get_metric(baseline_results, metric)
+            if value is None or not baseline_value:
+                continue
+            ratio = value / baseline_value
+            if higher_is_better:
+                regression = ratio < 1 / threshold
+            else:
+                regression = ratio > threshold
+            comparisons.append({
+                'benchmark': benchmark_id,
+                'metric': metric,
+                'baseline': baseline_value,
+                'value': value,
+                'ratio': ratio,
+                'regression': regression,
+            })
+    return comparisons
+
+
+def print_comparisons(comparisons):
+    for comparison in comparisons:
+        flag = 'REGRESSION' if comparison['regression'] else ''
+        print(
+            f"{comparison['benchmark']:<28}{comparison['metric']:<22}"
+            f"{comparison['baseline']:>12.4g}{comparison['value']:>12.4g}"
+            f"{comparison['ratio']:>8.2f}  {flag}")
+
+
+def test_benchmarks():
+    report = run_benchmarks(['cobrapy_e_coli_core'], n_steps=3, isolate=False)
+    results = report['benchmarks']['cobrapy_e_coli_core']
+    assert 'error' not in results, results.get('error')
+    assert results['step_latency']['p50'] <= results['step_latency']['max']
+
+    # a report does not regress against itself
+    comparisons = compare_benchmarks(report, json.loads(json.dumps(report)))
+    assert comparisons and not any(comparison['regression'] for comparison in comparisons)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark Biosimulators')
+    parser.add_argument(
+        '--benchmarks', '-b', nargs='+', choices=list(BENCHMARK_SPECS.keys()),
+        help='the benchmarks to run, default is all')
+    parser.add_argument('--steps', '-n', type=int, default=20, help='the number of steps to time')
+    parser.add_argument('--time-step', '-t', type=float, default=1., help='the time step')
+    parser.add_argument('--output', '-o', help='write the JSON report to this file')
+    parser.add_argument('--compare', '-c', help='compare against a baseline JSON report')
+    parser.add_argument(
+        '--threshold', type=float, default=1.2,
+        help='the ratio against the baseline that counts as a regression')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.benchmarks, args.steps, args.time_step)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        comparisons = compare_benchmarks(report, baseline, args.threshold)
+        print_comparisons(comparisons)
+        if any(comparison['regression'] for comparison in comparisons):
+            sys.exit(1)
+
+
+# run with python vivarium_biosimulators/experiments/benchmarks.py
+if __name__ == '__main__':
+    main()
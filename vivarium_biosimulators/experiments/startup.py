@@ -0,0 +1,134 @@
+"""
+Report Biosimulator startup time
+================================
+
+Measures, in a fresh interpreter for each case, the time to import the
+Biosimulator process module and the biosimulator api, to construct a
+Biosimulator, and to start worker subprocesses, with and without
+``prewarm_workers``. Only the standard library and the model paths are
+imported at module level, so that the measured imports are not already loaded.
+
+Execute by running::
+
+    python vivarium_biosimulators/experiments/startup.py -o startup.json
+"""
+
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+from vivarium_biosimulators.models.model_paths import MILLARD2016_PATH, BIGG_ECOLI_CORE_PATH
+
+
+# ModelLanguage.SBML.value, without importing biosimulators_utils
+SBML = 'urn:sedml:language:sbml'
+
+# {biosimulator api: Biosimulator config}
+STARTUP_SPECS = {
+    'biosimulators_tellurium': {
+        'biosimulator_api': 'biosimulators_tellurium',
+        'model_source': MILLARD2016_PATH,
+        'model_language': SBML,
+        'simulation': 'uniform_time_course',
+    },
+    'biosimulators_cobrapy': {
+        'biosimulator_api': 'biosimulators_cobrapy',
+        'model_source': BIGG_ECOLI_CORE_PATH,
+        'model_language': SBML,
+        'simulation': 'steady_state',
+        'algorithm': {
+            'kisao_id': 'KISAO_0000437',
+        },
+    },
+}
+
+
+def measure_startup(config, prewarm=False, n_workers=2):
+    """ time the imports, construction, and worker starts of a Biosimulator in this interpreter """
+    import importlib
+    import warnings; warnings.filterwarnings('ignore')
+
+    times = {'prewarm': prewarm}
+    if prewarm:
+        from vivarium_biosimulators.library.workers import prewarm_workers
+        prewarm_workers([config['biosimulator_api']])
+
+    start = time.perf_counter()
+    from vivarium_biosimulators.processes.biosimulator_process import Biosimulator
+    times['import_time'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    importlib.import_module(config['biosimulator_api'])
+    times['api_import_time'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    process = Biosimulator(config)
+    times['construction_time'] = time.perf_counter() - start
+
+    # later workers are forked from the fork server with the api imported
+    from vivarium_biosimulators.library.workers import BiosimulatorWorker
+    times['worker_start_times'] = []
+    for _ in range(n_workers):
+        start = time.perf_counter()
+        worker = BiosimulatorWorker(config, len(process.output_ids))
+        times['worker_start_times'].append(time.perf_counter() - start)
+        worker.end()
+    return times
+
+
+def run_measure_startup(biosimulator_api, prewarm, n_workers):
+    """ run measure_startup in a fresh interpreter """
+    code = (
+        'import json; '
+        'from vivarium_biosimulators.experiments.startup import STARTUP_SPECS, measure_startup; '
+        f'print(json.dumps(measure_startup(STARTUP_SPECS[{biosimulator_api!r}], {prewarm}, {n_workers})))'
+    )
+    completed = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def report_startup(biosimulator_apis=None, n_workers=2):
+    """
+    Returns:
+        dict: {biosimulator api: {'cold': times, 'prewarmed': times}}
+    """
+    biosimulator_apis = biosimulator_apis or list(STARTUP_SPECS.keys())
+    report = {}
+    for biosimulator_api in biosimulator_apis:
+        print(f'STARTUP {biosimulator_api}')
+        report[biosimulator_api] = {
+            'cold': run_measure_startup(biosimulator_api, False, n_workers),
+            'prewarmed': run_measure_startup(biosimulator_api, True, n_workers),
+        }
+    return report
+
+
+def test_startup():
+    times = measure_startup(STARTUP_SPECS['biosimulators_cobrapy'], n_workers=0)
+    assert times['construction_time'] > 0
+    assert times['worker_start_times'] == []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='report Biosimulator startup time')
+    parser.add_argument(
+        '--apis', '-a', nargs='+', choices=list(STARTUP_SPECS.keys()),
+        help='the biosimulator apis, default is all')
+    parser.add_argument('--workers', '-w', type=int, default=2, help='the number of workers to start')
+    parser.add_argument('--output', '-o', help='write the JSON report to this file')
+    args = parser.parse_args()
+
+    report = report_startup(args.apis, args.workers)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+# run with python vivarium_biosimulators/experiments/startup.py
+if __name__ == '__main__':
+    main()
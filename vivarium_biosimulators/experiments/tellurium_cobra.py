@@ -37,6 +37,8 @@ FLUX_TO_BOUNDS_MAP = {
 def test_tellurium_cobrapy(
         total_time=10.,
         time_step=1.,
+        concurrent=False,
+        fba_config=None,
         verbose=False,
 ):
     import warnings;
@@ -62,11 +64,13 @@ def test_tellurium_cobrapy(
             'algorithm': {
                 'kisao_id': 'KISAO_0000437',
             },
+            **(fba_config or {}),
         },
         'flux_to_bounds_map': FLUX_TO_BOUNDS_MAP,
         'flux_unit': 'mol/L',
         'bounds_unit': 'mmol/g/hr',
         'default_store_name': 'state',
+        'concurrent': concurrent,
     }
     ode_fba_composer = ODE_FBA(config)
 
@@ -107,6 +111,76 @@ def test_tellurium_cobrapy(
     return output
 
 
+def test_concurrent_tellurium_cobrapy(
+        total_time=3.,
+        time_step=1.,
+):
+    # a serial run where the fba also uses the bounds from the start of each time step
+    output = test_tellurium_cobrapy(
+        total_time=total_time,
+        time_step=time_step,
+        fba_config={'run_as_process': True, 'time_step': time_step})
+    concurrent_output = test_tellurium_cobrapy(
+        total_time=total_time, time_step=time_step, concurrent=True)
+
+    # the ode and the fba outputs match the serial run
+    assert concurrent_output['time'] == output['time']
+    for store in ['state', 'bounds']:
+        for variable_id, values in output[store].items():
+            for value, concurrent_value in zip(values, concurrent_output[store][variable_id]):
+                assert abs(concurrent_value - value) <= 1e-6 * (1 + abs(value)), variable_id
+    assert output['state']['R_EX_glc__D_e'][-1] != output['state']['R_EX_glc__D_e'][0]
+
+    # the fba can not follow an adaptive ode time step
+    composer = ODE_FBA({
+        'ode_config': {'adaptive_time_step': True},
+        'fba_config': {},
+        'flux_to_bounds_map': FLUX_TO_BOUNDS_MAP,
+        'concurrent': True,
+    })
+    try:
+        composer.generate()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('concurrent with adaptive_time_step should raise')
+
+
+def test_ode_fba_generate_once():
+    import warnings; warnings.filterwarnings('ignore')
+    config = {
+        'ode_config': {
+            'biosimulator_api': 'biosimulators_tellurium',
+            'model_source': SBML_MODEL_PATH,
+            'simulation': 'uniform_time_course',
+            'model_language': ModelLanguage.SBML.value,
+        },
+        'fba_config': {
+            'biosimulator_api': 'biosimulators_cobrapy',
+            'model_source': BIGG_MODEL_PATH,
+            'simulation': 'steady_state',
+            'model_language': ModelLanguage.SBML.value,
+            'algorithm': {
+                'kisao_id': 'KISAO_0000437',
+            },
+        },
+        'flux_to_bounds_map': FLUX_TO_BOUNDS_MAP,
+        'flux_unit': 'mol/L',
+        'bounds_unit': 'mmol/g/hr',
+    }
+    ode_fba_composer = ODE_FBA(config)
+    ode_fba_composer.initial_state()
+    _, initial_state_composite = ode_fba_composer.initial_state_composite
+
+    # generate reuses the processes that made the initial state, which already ran their tasks
+    ode_fba_composite = ode_fba_composer.generate()
+    assert ode_fba_composite is initial_state_composite
+    assert ode_fba_composite['processes']['fba'].initial_output_values is not None
+
+    # later composites get their own processes
+    assert ode_fba_composer.generate()['processes']['fba'] is not ode_fba_composite['processes']['fba']
+
+
 def main():
     output = test_tellurium_cobrapy(
         total_time=10.,
@@ -11,6 +11,9 @@ TODO:
  - test quadratic moma fba: KISAO_0000593  (not yet mapped to methods in cobrapy)
 """
 import os
+import tempfile
+
+import numpy as np
 
 from vivarium.processes.timeline import TimelineProcess
 from vivarium.core.engine import Engine, pf
@@ -21,10 +24,33 @@ from vivarium.core.control import run_library_cli
 
 from biosimulators_utils.sedml.data_model import ModelLanguage
 from vivarium_biosimulators.processes.biosimulator_process import Biosimulator
+from vivarium_biosimulators.processes.batched_biosimulator import BatchedBiosimulator
 from vivarium_biosimulators.library.mappings import remove_multi_update
+from vivarium_biosimulators.library.response_surface import sample_response_surface
+from vivarium_biosimulators.library.parameter_scan import make_grid_points, run_parameter_scan, read_scan_results
 from vivarium_biosimulators.models.model_paths import BIGG_iAF1260b_PATH, BIGG_ECOLI_CORE_PATH
 
 
+COBRA_CONFIG = {
+    'biosimulator_api': 'biosimulators_cobrapy',
+    'model_source': BIGG_ECOLI_CORE_PATH,
+    'model_language': ModelLanguage.SBML.value,
+    'simulation': 'steady_state',
+    'algorithm': {
+        'kisao_id': 'KISAO_0000437',
+    },
+}
+
+
+def assert_close(values, expected, tolerance=1e-6):
+    """ assert that values, a number or a {variable id: value} dict, match expected to a relative tolerance """
+    if isinstance(expected, dict):
+        for variable_id, value in expected.items():
+            assert_close(values[variable_id], value, tolerance)
+        return
+    assert abs(values - expected) <= tolerance * (1 + abs(expected)), (values, expected)
+
+
 def test_cobra_process(
     total_time=2.,
     model_source=BIGG_iAF1260b_PATH,
@@ -90,6 +116,265 @@ def test_cobra_process(
     return output
 
 
+def test_lazy_initial_state(
+    model_source=BIGG_ECOLI_CORE_PATH,
+):
+    import warnings; warnings.filterwarnings('ignore')
+    config = {
+        **COBRA_CONFIG,
+        'model_source': model_source,
+        'default_output_value': 0.,
+    }
+    process = Biosimulator(config)
+
+    # the schema uses the declared default, without running the task
+    schema = process.get_schema()
+    assert schema['outputs']['obj']['_default'] == 0.
+    assert process.initial_output_values is None
+
+    # the initial state runs the task
+    initial_state = process.initial_state()
+    assert initial_state['outputs']['obj'] > 0.
+
+
+def test_incremental_changes(
+    model_source=BIGG_ECOLI_CORE_PATH,
+):
+    import warnings; warnings.filterwarnings('ignore')
+    config = {**COBRA_CONFIG, 'model_source': model_source}
+    process = Biosimulator(config)
+    incremental_process = Biosimulator({**config, 'incremental_changes': True})
+
+    state = process.initial_state()
+    incremental_process.next_update(1., state)
+    for glc_bound in [-10, -8, -8]:
+        state['inputs']['lower_bound_reaction_R_EX_glc__D_e'] = glc_bound
+        update = process.next_update(1., state)
+        incremental_update = incremental_process.next_update(1., state)
+        assert len(incremental_process.task.model.changes) <= 1
+        assert_close(incremental_update['outputs'], update['outputs'])
+
+
+def test_warm_start(
+    model_source=BIGG_ECOLI_CORE_PATH,
+):
+    import warnings; warnings.filterwarnings('ignore')
+    config = {**COBRA_CONFIG, 'model_source': model_source}
+    process = Biosimulator(config)
+    warm_process = Biosimulator({**config, 'warm_start': True, 'incremental_changes': True})
+
+    state = process.initial_state()
+    for glc_bound in [-10, -6, -2, -6]:
+        state['inputs']['lower_bound_reaction_R_EX_glc__D_e'] = glc_bound
+        update = process.next_update(1., state)
+        warm_update = warm_process.next_update(1., state)
+        objective = update['outputs']['obj'] + state['outputs']['obj']
+        warm_objective = warm_update['outputs']['obj'] + state['outputs']['obj']
+        assert_close(warm_objective, objective)
+
+
+def test_checkpoint(
+    model_source=BIGG_ECOLI_CORE_PATH,
+):
+    import warnings; warnings.filterwarnings('ignore')
+    config = {
+        **COBRA_CONFIG,
+        'model_source': model_source,
+        'warm_start': True,
+        'incremental_changes': True,
+    }
+    process = Biosimulator(config)
+    state = process.initial_state()
+    state['inputs']['lower_bound_reaction_R_EX_glc__D_e'] = -6
+    process.next_update(1., state)
+
+    # the restored process keeps the applied bounds and the LP basis
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        checkpoint_path = os.path.join(checkpoint_dir, 'checkpoint.pkl')
+        process.save_checkpoint(checkpoint_path, state)
+        restored_process = Biosimulator({**config, 'checkpoint': checkpoint_path})
+    assert restored_process.applied_input_values == process.applied_input_values
+    assert restored_process.initial_state() == state
+
+    for glc_bound in [-6, -2]:
+        state['inputs']['lower_bound_reaction_R_EX_glc__D_e'] = glc_bound
+        update = process.next_update(1., state)
+        restored_update = restored_process.next_update(1., state)
+        assert_close(restored_update['outputs'], update['outputs'])
+
+
+def test_batched_cobra(
+    model_source=BIGG_ECOLI_CORE_PATH,
+):
+    import warnings; warnings.filterwarnings('ignore')
+    config = {**COBRA_CONFIG, 'model_source': model_source}
+    glc_bounds = [-10, -6, -2]
+    process = Biosimulator(config)
+    batched_process = BatchedBiosimulator({**config, 'batch_size': len(glc_bounds)})
+
+    # set a different glucose bound for each variant
+    batch_state = batched_process.initial_state()
+    glc_index = batched_process.port_index['inputs']['lower_bound_reaction_R_EX_glc__D_e']
+    batch_state['inputs'][:, glc_index] = glc_bounds
+    batch_update = batched_process.next_update(1., batch_state)
+    obj_index = batched_process.port_index['outputs']['obj']
+    batch_objectives = batch_update['outputs'][:, obj_index] + batch_state['outputs'][:, obj_index]
+
+    state = process.initial_state()
+    for glc_bound, batch_objective in zip(glc_bounds, batch_objectives):
+        state['inputs']['lower_bound_reaction_R_EX_glc__D_e'] = glc_bound
+        update = process.next_update(1., state)
+        objective = update['outputs']['obj'] + state['outputs']['obj']
+        assert_close(batch_objective, objective)
+
+
+def test_worker(
+    model_source=BIGG_ECOLI_CORE_PATH,
+):
+    import warnings; warnings.filterwarnings('ignore')
+    config = {**COBRA_CONFIG, 'model_source': model_source}
+    process = Biosimulator(config)
+    worker_process = Biosimulator({**config, 'worker': True})
+    assert worker_process.initial_state() == process.initial_state()
+
+    state = process.initial_state()
+    for glc_bound in [-10, -6]:
+        state['inputs']['lower_bound_reaction_R_EX_glc__D_e'] = glc_bound
+        update = process.next_update(1., state)
+
+        # the engine sends the command, and collects its result later
+        worker_process.send_command('next_update', (1., state))
+        worker_update = worker_process.get_command_result()
+        assert_close(worker_update['outputs'], update['outputs'])
+    worker_process.end_worker()
+
+
+def test_result_cache(
+    model_source=BIGG_ECOLI_CORE_PATH,
+):
+    import warnings; warnings.filterwarnings('ignore')
+    config = {**COBRA_CONFIG, 'model_source': model_source}
+    process = Biosimulator(config)
+    cached_process = Biosimulator({**config, 'result_cache_size': 2, 'result_cache_tolerance': 1e-3})
+
+    state = process.initial_state()
+    for glc_bound in [-10, -10.0001, -6, -10, -2, -6]:
+        state['inputs']['lower_bound_reaction_R_EX_glc__D_e'] = glc_bound
+        update = process.next_update(1., state)
+        cached_update = cached_process.next_update(1., state)
+        assert_close(cached_update['outputs']['obj'], update['outputs']['obj'], tolerance=1e-3)
+
+    # -10.0001 and -10 hit the cache, -6 was evicted by -2
+    assert cached_process.result_cache.stats() == {'hits': 2, 'misses': 4, 'size': 2}
+
+
+def test_response_surface(
+    model_source=BIGG_ECOLI_CORE_PATH,
+):
+    import warnings; warnings.filterwarnings('ignore')
+    config = {**COBRA_CONFIG, 'model_source': model_source}
+    glc_bound_id = 'lower_bound_reaction_R_EX_glc__D_e'
+    surface = sample_response_surface(
+        config, {glc_bound_id: np.linspace(-12, 0, 13)}, n_processes=2, n_validation_points=5)
+    with tempfile.TemporaryDirectory() as surface_dir:
+        surface_path = os.path.join(surface_dir, 'surface.npz')
+        surface.save(surface_path)
+        surface_process = Biosimulator({**config, 'response_surface': surface_path})
+    process = Biosimulator(config)
+    obj_error = surface_process.response_surface.get_error()['obj']
+
+    state = process.initial_state()
+    for glc_bound in [-10, -4.5, -14, -0.5]:
+        state['inputs'][glc_bound_id] = glc_bound
+        update = process.next_update(1., state)
+        surface_update = surface_process.next_update(1., state)
+        objective = update['outputs']['obj']
+        assert abs(surface_update['outputs']['obj'] - objective) <= obj_error + 1e-6 * (1 + abs(objective))
+
+    # -14 is outside of the sampled domain, and -0.5 is next to an infeasible sample
+    assert surface_process.response_surface.hits == 2
+    assert surface_process.response_surface.fallbacks == 2
+
+
+def test_output_selection(
+    model_source=BIGG_ECOLI_CORE_PATH,
+):
+    import warnings; warnings.filterwarnings('ignore')
+    config = {**COBRA_CONFIG, 'model_source': model_source}
+    process = Biosimulator(config)
+
+    # only the objective is wired and emitted
+    selected_process = Biosimulator({
+        **config,
+        'output_ports': {'objective': ['obj']},
+        'emit_ports': ['objective'],
+        'output_variables': 'auto',
+    })
+    assert [variable.id for variable in selected_process.outputs] == ['obj']
+    assert set(selected_process.ports_schema().keys()) == {'inputs', 'objective'}
+
+    # a port can also be given a single variable id
+    single_process = Biosimulator({
+        **config,
+        'output_ports': {'objective': 'obj'},
+        'emit_ports': ['objective'],
+        'output_variables': 'auto',
+    })
+    assert [variable.id for variable in single_process.outputs] == ['obj']
+
+    state = process.initial_state()
+    selected_state = selected_process.initial_state()
+    for glc_bound in [-10, -6]:
+        state['inputs']['lower_bound_reaction_R_EX_glc__D_e'] = glc_bound
+        selected_state['inputs']['lower_bound_reaction_R_EX_glc__D_e'] = glc_bound
+        objective = process.next_update(1., state)['outputs']['obj'] + state['outputs']['obj']
+        selected_objective = selected_process.next_update(1., selected_state)['objective']['obj'] + \
+            selected_state['objective']['obj']
+        assert_close(selected_objective, objective)
+
+
+def test_parameter_scan(
+    model_source=BIGG_ECOLI_CORE_PATH,
+):
+    import warnings; warnings.filterwarnings('ignore')
+    config = {
+        **COBRA_CONFIG,
+        'model_source': model_source,
+        'output_variables': ['obj'],
+    }
+    points = make_grid_points({
+        'lower_bound_reaction_R_EX_glc__D_e': [-10, -6],
+        'lower_bound_reaction_R_EX_o2_e': [-20, -5],
+    })
+
+    with tempfile.TemporaryDirectory() as scan_dir:
+        results_path = os.path.join(scan_dir, 'scan.jsonl')
+        summary = run_parameter_scan(
+            config, points, results_path, n_processes=2, chunk_size=1, progress=None)
+        assert summary == {'finished': 4, 'failed': 0, 'resumed': 0}
+        results = read_scan_results(results_path)
+
+        # the results match solves in this process
+        process = Biosimulator(config)
+        for point, record in zip(points, results):
+            objective = process.solve({**process.input_initial_value, **point}, 1.)[0]
+            assert record['inputs'] == point
+            assert_close(record['outputs']['obj'], objective)
+
+        # resume after a crash that left two records and a partly written line
+        with open(results_path) as results_file:
+            lines = results_file.readlines()
+        with open(results_path, 'w') as results_file:
+            results_file.writelines(lines[:2] + [lines[2][:10]])
+        summary = run_parameter_scan(
+            config, points, results_path, n_processes=2, chunk_size=1, progress=None)
+        assert summary == {'finished': 2, 'failed': 0, 'resumed': 2}
+        resumed_results = read_scan_results(results_path)
+        assert [record['index'] for record in resumed_results] == [0, 1, 2, 3]
+        for record, resumed_record in zip(results, resumed_results):
+            assert_close(resumed_record['outputs'], record['outputs'])
+
+
 def main(model_source=BIGG_iAF1260b_PATH, **kwargs):
     output = test_cobra_process(
         model_source=model_source,
@@ -5,6 +5,13 @@ Test Biosimulator's Tellurium API
 Execute by running: ``python vivarium_biosimulators/processes/test_tellurium.py``
 """
 
+import os
+import copy
+import tempfile
+
+import numpy as np
+
+from biosimulators_utils.sedml import model_utils
 from biosimulators_utils.sedml.data_model import ModelLanguage
 
 from vivarium.core.engine import Engine, pf
@@ -12,27 +19,57 @@ from vivarium.core.composer import Composite
 from vivarium.core.control import run_library_cli
 from vivarium.plots.simulation_output import plot_simulation_output
 from vivarium_biosimulators.processes.biosimulator_process import Biosimulator
-from vivarium_biosimulators.library.mappings import remove_multi_update
+from vivarium_biosimulators.processes.batched_biosimulator import BatchedBiosimulator
+from vivarium_biosimulators.library.mappings import remove_multi_update, tellurium_mapping
+from vivarium_biosimulators.library.introspection import MODEL_METADATA, get_model_metadata, clear_model_metadata
+from vivarium_biosimulators.library.model_cache import ModelVariablesCache
+from vivarium_biosimulators.library.model_templates import clear_model_templates
+from vivarium_biosimulators.library.emitters import ColumnarReader
 from vivarium_biosimulators.models.model_paths import MILLARD2016_PATH
 
 
 SBML_MODEL_PATH = MILLARD2016_PATH
 
+TELLURIUM_CONFIG = {
+    'biosimulator_api': 'biosimulators_tellurium',
+    'model_source': SBML_MODEL_PATH,
+    'model_language': ModelLanguage.SBML.value,
+    'simulation': 'uniform_time_course',
+}
+
+
+def assert_close(values, expected, tolerance=1e-6):
+    """ assert that values, a number or a {variable id: value} dict, match expected to a relative tolerance """
+    if isinstance(expected, dict):
+        for variable_id, value in expected.items():
+            assert_close(values[variable_id], value, tolerance)
+        return
+    assert abs(values - expected) <= tolerance * (1 + abs(expected)), (values, expected)
+
+
+def step(process, state, interval=1.):
+    """ run one update of process and add its output deltas to state, returns the update """
+    update = process.next_update(interval, state)
+    for variable_id, delta in update['outputs'].items():
+        state['outputs'][variable_id] += delta
+    return update
+
 
 def test_tellurium_process(
         total_time=10.,
         time_step=1.,
+        stateful_stepping=False,
+        incremental_changes=False,
 ):
     import warnings; warnings.filterwarnings('ignore')
 
     # config
     config = {
-        'biosimulator_api': 'biosimulators_tellurium',
-        'model_source': SBML_MODEL_PATH,
-        'model_language': ModelLanguage.SBML.value,
-        'simulation': 'uniform_time_course',
+        **TELLURIUM_CONFIG,
         'emit_ports': ['outputs'],
         'time_step': time_step,
+        'stateful_stepping': stateful_stepping,
+        'incremental_changes': incremental_changes,
     }
 
     # make the process
@@ -69,14 +106,450 @@ def test_tellurium_process(
     return output
 
 
+def test_model_cache():
+    import warnings; warnings.filterwarnings('ignore')
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ModelVariablesCache(cache_dir)
+        config = {
+            **TELLURIUM_CONFIG,
+            'model_cache': cache,
+        }
+
+        # count the model parses
+        parses = []
+        parse = model_utils.get_parameters_variables_outputs_for_simulation
+
+        def counting_parse(*args, **kwargs):
+            parses.append(args)
+            return parse(*args, **kwargs)
+        model_utils.get_parameters_variables_outputs_for_simulation = counting_parse
+
+        # the first build fills the cache, the second reads from it without parsing the model
+        try:
+            process = Biosimulator(config)
+            assert len(cache.entries()) == 1
+            assert parses
+            parses.clear()
+            cached_process = Biosimulator(config)
+        finally:
+            model_utils.get_parameters_variables_outputs_for_simulation = parse
+        assert not parses
+        assert cached_process.input_target_map == process.input_target_map
+        assert [v.id for v in cached_process.outputs] == [v.id for v in process.outputs]
+
+        cache.invalidate()
+        assert not cache.entries()
+
+
+def test_tellurium_mapping():
+    import warnings; warnings.filterwarnings('ignore')
+    clear_model_metadata()
+
+    # the mapping is read from the model's metadata, and then from memory
+    input_output_map = tellurium_mapping(SBML_MODEL_PATH)
+    assert tellurium_mapping(SBML_MODEL_PATH) == input_output_map
+    assert len(MODEL_METADATA) == 1
+
+    # the ids match the process' ports
+    model_metadata = get_model_metadata(SBML_MODEL_PATH, ModelLanguage.SBML.value)
+    process = Biosimulator(TELLURIUM_CONFIG)
+    assert list(model_metadata['inputs'].keys()) == list(process.input_target_map.keys())
+    assert list(model_metadata['outputs'].keys()) == process.output_ids
+    for input_id, output_id in input_output_map.items():
+        input_target = process.input_target_map[input_id]
+        output_target = process.outputs[process.output_ids.index(output_id)].target
+        assert input_target.startswith(output_target + '/@initial')
+
+
+def test_shared_model_template():
+    import warnings; warnings.filterwarnings('ignore')
+
+    config = {
+        **TELLURIUM_CONFIG,
+        'share_model_template': True,
+    }
+    clear_model_templates()
+    process = Biosimulator(config)
+    shared_process = Biosimulator(config)
+    other_shared_process = Biosimulator(config)
+    clear_model_templates()
+
+    # variables are shared, solver state is not
+    assert shared_process.inputs is process.inputs
+    assert shared_process.preprocessed_task.road_runner is not process.preprocessed_task.road_runner
+
+    # the initial state is only simulated once
+    state = process.initial_state()
+    assert shared_process.get_initial_output_values() is process.initial_output_values
+
+    # stepping one process does not change the other
+    update = shared_process.next_update(1., state)
+    shared_process.next_update(1., state)
+    other_update = other_shared_process.next_update(1., state)
+    assert_close(other_update['outputs'], update['outputs'])
+
+
+def test_stateful_stepping(
+        total_time=3,
+):
+    import warnings; warnings.filterwarnings('ignore')
+
+    process = Biosimulator({**TELLURIUM_CONFIG, 'stateful_stepping': True})
+    state = process.initial_state()
+    for _ in range(total_time):
+        step(process, state)
+
+    # compare to a single run of the task from the initial conditions
+    reference_process = Biosimulator(TELLURIUM_CONFIG)
+    reference_process.preprocessed_task.road_runner.reset()
+    reference_process.task.simulation.number_of_points = total_time
+    results = reference_process.run_task(reference_process.input_initial_value, total_time)
+    assert_close(state['outputs'], {
+        variable_id: values[-1] for variable_id, values in results.items()}, 1e-4)
+
+
+def test_incremental_changes(
+        total_time=3.,
+):
+    import warnings; warnings.filterwarnings('ignore')
+
+    # a time course that re-runs from time 0 needs all of its inputs
+    config = {
+        **TELLURIUM_CONFIG,
+        'incremental_changes': True,
+    }
+    try:
+        Biosimulator(config)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('incremental_changes without stateful_stepping should raise')
+
+    # with stateful stepping, only changed inputs are applied. The species inputs share their stores
+    # with the outputs, and the run matches a run whose inputs are not moved by its outputs.
+    output = test_tellurium_process(
+        total_time=total_time, stateful_stepping=True, incremental_changes=True)
+    process = Biosimulator({**config, 'stateful_stepping': True})
+    state = process.initial_state()
+    for index in range(int(total_time)):
+        step(process, state)
+        assert_close(
+            {variable_id: values[index + 1] for variable_id, values in output['state'].items()},
+            {variable_id: value for variable_id, value in state['outputs'].items() if variable_id != 'time'})
+
+
+def test_stateful_stepping_shared_store(
+        total_time=4,
+):
+    import warnings; warnings.filterwarnings('ignore')
+
+    config = {
+        **TELLURIUM_CONFIG,
+        'stateful_stepping': True,
+    }
+    process = Biosimulator(config)
+
+    # record whether each step resets the integrator
+    resets = []
+    advance = process.advance
+
+    def recording_advance(changes, interval, reset):
+        resets.append(reset)
+        return advance(changes, interval, reset)
+    process.advance = recording_advance
+
+    # the species inputs share their stores with the outputs, as in test_tellurium_process
+    state = process.initial_state()
+    for _ in range(total_time):
+        step(process, state)
+        for variable_id in state['inputs']:
+            if variable_id in state['outputs']:
+                state['inputs'][variable_id] = state['outputs'][variable_id]
+
+    # only the first step resets, since the model's own dynamics moved the species
+    assert resets == [True] + [False] * (total_time - 1)
+
+    # a change from outside the model resets the integrator
+    state['inputs']['ACCOA'] *= 2
+    process.next_update(1., state)
+    assert resets[-1]
+
+
+def test_checkpoint(
+        total_time=4,
+):
+    import warnings; warnings.filterwarnings('ignore')
+
+    config = {
+        **TELLURIUM_CONFIG,
+        'stateful_stepping': True,
+    }
+
+    # checkpoint halfway through the run
+    process = Biosimulator(config)
+    state = process.initial_state()
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        checkpoint_path = os.path.join(checkpoint_dir, 'checkpoint.pkl')
+        for time in range(total_time):
+            if time == total_time // 2:
+                process.save_checkpoint(checkpoint_path, copy.deepcopy(state))
+            step(process, state)
+
+        # the restored process continues from the checkpoint
+        restored_process = Biosimulator({**config, 'checkpoint': checkpoint_path})
+    assert restored_process.simulation_time == total_time // 2
+    restored_state = restored_process.initial_state()
+    for _ in range(total_time - total_time // 2):
+        step(restored_process, restored_state)
+    assert_close(restored_state['outputs'], state['outputs'])
+
+
+def test_columnar_emitter(
+        total_time=7.,
+):
+    import warnings; warnings.filterwarnings('ignore')
+
+    config = {
+        **TELLURIUM_CONFIG,
+        'emit_ports': ['outputs', 'inputs'],
+        'stateful_stepping': True,
+    }
+
+    def run(emitter):
+        process = Biosimulator(config)
+        experiment = Engine(
+            processes={'tellurium': process},
+            topology={'tellurium': {'outputs': ('outputs',), 'inputs': ('inputs',)}},
+            initial_state=process.initial_state(),
+            emitter=emitter,
+            display_info=False,
+        )
+        experiment.update(total_time)
+        return experiment.emitter
+
+    with tempfile.TemporaryDirectory() as emitter_dir:
+        emitter = run({'type': 'columnar', 'path': emitter_dir, 'chunk_size': 3})
+        timeseries = run('timeseries').get_timeseries()
+
+        # a query only reads the selected columns, memory mapped
+        columnar_timeseries = emitter.get_timeseries(query=[('outputs',)])
+        assert 'inputs' not in columnar_timeseries
+        assert list(columnar_timeseries['time']) == timeseries['time']
+        for variable_id, values in timeseries['outputs'].items():
+            assert np.array_equal(columnar_timeseries['outputs'][variable_id], values), variable_id
+
+        # the inputs do not change, so they are recorded as constants
+        reader = ColumnarReader(emitter_dir)
+        for variable_id, values in timeseries['inputs'].items():
+            column = reader.columns[f'inputs/{variable_id}']
+            assert [list(segment.keys()) for segment in column['segments']] == [['start', 'length', 'value']]
+            assert np.array_equal(reader.read(('inputs', variable_id)), values)
+
+    # float32 columns
+    with tempfile.TemporaryDirectory() as emitter_dir:
+        emitter = run({'type': 'columnar', 'path': emitter_dir, 'float32': True})
+        columnar_timeseries = emitter.get_timeseries()
+        for variable_id, values in timeseries['outputs'].items():
+            assert columnar_timeseries['outputs'][variable_id].dtype == np.float32
+            assert np.allclose(columnar_timeseries['outputs'][variable_id], values, rtol=1e-6)
+
+
+def test_array_ports(
+        total_time=3.,
+):
+    import warnings; warnings.filterwarnings('ignore')
+
+    process = Biosimulator(TELLURIUM_CONFIG)
+    array_process = Biosimulator({**TELLURIUM_CONFIG, 'array_ports': True})
+
+    # array ports need their own stores
+    composite = Composite({
+        'processes': {'tellurium': array_process},
+        'topology': {'tellurium': {'outputs': ('outputs',), 'inputs': ('inputs',)}},
+    })
+    experiment = Engine(
+        processes=composite.processes,
+        topology=composite.topology,
+        initial_state=composite.initial_state(),
+    )
+    experiment.update(total_time)
+    outputs = experiment.state.get_value()['outputs']
+
+    state = process.initial_state()
+    for _ in range(int(total_time)):
+        step(process, state)
+    output_index = array_process.port_index['outputs']
+    for variable_id, value in state['outputs'].items():
+        assert_close(outputs[output_index[variable_id]], value)
+
+
+def test_batched_tellurium(
+        total_time=3,
+        batch_size=3,
+):
+    import warnings; warnings.filterwarnings('ignore')
+
+    process = Biosimulator({**TELLURIUM_CONFIG, 'stateful_stepping': True})
+    batched_process = BatchedBiosimulator({**TELLURIUM_CONFIG, 'batch_size': batch_size})
+
+    state = process.initial_state()
+    batch_state = batched_process.initial_state()
+    for _ in range(total_time):
+        step(process, state)
+        batch_state['outputs'] += batched_process.next_update(1., batch_state)['outputs']
+
+    # identical variants match the unbatched process
+    output_index = batched_process.port_index['outputs']
+    for variable_id, value in state['outputs'].items():
+        for batch_value in batch_state['outputs'][:, output_index[variable_id]]:
+            assert_close(batch_value, value)
+
+
+def test_batched_tellurium_variants(
+        total_time=3,
+        batch_size=3,
+):
+    import warnings; warnings.filterwarnings('ignore')
+
+    batched_process = BatchedBiosimulator({**TELLURIUM_CONFIG, 'batch_size': batch_size})
+    batch_state = batched_process.initial_state()
+
+    # variant 1 doubles the species ACCOA, variant 2 multiplies the parameter FEED by 5,
+    # and each variant is compared to its own process
+    input_index = batched_process.port_index['inputs']
+    batch_state['inputs'][1, input_index['ACCOA']] *= 2
+    batch_state['inputs'][2, input_index['FEED']] *= 5
+    processes = []
+    states = []
+    for variant in range(batch_size):
+        process = Biosimulator({**TELLURIUM_CONFIG, 'stateful_stepping': True})
+        state = process.initial_state()
+        for variable_id, index in input_index.items():
+            state['inputs'][variable_id] = batch_state['inputs'][variant, index]
+        processes.append(process)
+        states.append(state)
+
+    for _ in range(total_time):
+        for process, state in zip(processes, states):
+            step(process, state)
+        batch_state['outputs'] += batched_process.next_update(1., batch_state)['outputs']
+
+    output_index = batched_process.port_index['outputs']
+    for variant, state in enumerate(states):
+        for variable_id, value in state['outputs'].items():
+            assert_close(batch_state['outputs'][variant, output_index[variable_id]], value)
+    assert states[1]['outputs']['ACCOA'] != states[0]['outputs']['ACCOA']
+    assert states[2]['outputs']['ACCOA'] != states[0]['outputs']['ACCOA']
+
+
+def test_adaptive_time_step(
+        total_time=20.,
+):
+    import warnings; warnings.filterwarnings('ignore')
+
+    config = {
+        **TELLURIUM_CONFIG,
+        'stateful_stepping': True,
+        'adaptive_time_step': True,
+        'min_time_step': 0.1,
+        'max_time_step': 5.,
+    }
+    process = Biosimulator(config)
+    state = process.initial_state()
+    time = 0.
+    time_steps = []
+    while time < total_time:
+        time_step = process.calculate_timestep(state)
+        assert 0.1 <= time_step <= 5.
+        step(process, state, time_step)
+        time += time_step
+        time_steps.append(time_step)
+
+    # the step adapts away from the fixed time_step
+    assert len(set(time_steps)) > 1
+
+
+def test_timing(
+        total_time=3.,
+):
+    import warnings; warnings.filterwarnings('ignore')
+
+    config = {
+        **TELLURIUM_CONFIG,
+        'diagnostics_port': 'diagnostics',
+    }
+    process = Biosimulator(config)
+    composite = Composite({
+        'processes': {'tellurium': process},
+        'topology': {'tellurium': {
+            'outputs': ('state',),
+            'inputs': ('state',),
+            'diagnostics': ('diagnostics',),
+        }},
+    })
+    experiment = Engine(
+        processes=composite.processes,
+        topology=composite.topology,
+        initial_state=remove_multi_update(composite.initial_state()),
+    )
+
+    # only time the steps, not the initial state's run
+    process.reset_timings()
+    experiment.update(total_time)
+
+    timings = process.get_timings()
+    for phase in ['changes', 'exec', 'results', 'deltas']:
+        assert timings[phase]['count'] == total_time
+        assert timings[phase]['time'] >= 0
+    assert timings['exec']['time'] >= timings['changes']['time']
+
+    # the diagnostics port emits the timings
+    diagnostics = experiment.emitter.get_timeseries()['diagnostics']
+    assert diagnostics['exec']['count'][-1] == total_time
+
+    # timing is off by default
+    assert Biosimulator({**config, 'diagnostics_port': None}).get_timings() == {}
+
+
+def test_trajectory(
+        number_of_points=4,
+        interval=2.,
+):
+    import warnings; warnings.filterwarnings('ignore')
+
+    config = {
+        **TELLURIUM_CONFIG,
+        'stateful_stepping': True,
+    }
+    process = Biosimulator(config)
+    trajectory_process = Biosimulator({
+        **config,
+        'number_of_points': number_of_points,
+        'trajectory_port': 'trajectory',
+    })
+
+    # one update with number_of_points gives the same points as that many updates
+    state = trajectory_process.initial_state()
+    trajectory = trajectory_process.next_update(interval, state)['trajectory']
+    assert trajectory.shape == (number_of_points, len(trajectory_process.output_ids))
+
+    state = process.initial_state()
+    for point in range(number_of_points):
+        step(process, state, interval / number_of_points)
+        assert_close(dict(zip(process.output_ids, trajectory[point])), state['outputs'])
+
+
 def run_once(
     dt=1.,
     total_time=30.,
+    stateful_stepping=False,
 ):
     plot_settings = {'max_rows': 10}
     output = test_tellurium_process(
         total_time=total_time,
-        time_step=dt)
+        time_step=dt,
+        stateful_stepping=stateful_stepping)
     dt_str = str(dt).replace('.', '')
     plot_simulation_output(
         output,
@@ -86,17 +559,23 @@ def run_once(
     )
 
 
-def scan_dt():
+def scan_dt(stateful_stepping=False):
     total_time = 30
     for dt in [1e-1, 1e0, 2e0]:
         run_once(
             dt=dt,
             total_time=total_time,
+            stateful_stepping=stateful_stepping,
         )
 
+
+def scan_dt_stateful():
+    scan_dt(stateful_stepping=True)
+
 exp_library = {
     '0': run_once,
     '1': scan_dt,
+    '2': scan_dt_stateful,
 }
 
 # run with python vivarium_biosimulators/experiments/test_tellurium.py -n [exp_library_id]
@@ -0,0 +1,9 @@
+""" vivarium-biosimulators library init
+Register emitters upon import
+"""
+
+from vivarium.core.registry import emitter_registry
+from vivarium_biosimulators.library.emitters import ColumnarEmitter
+
+
+emitter_registry.register('columnar', ColumnarEmitter)
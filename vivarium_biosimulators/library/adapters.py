@@ -0,0 +1,283 @@
+"""
+========
+Adapters
+========
+
+An adapter handles the native solver state of a biosimulator api's
+preprocessed tasks. It can step a task from its current simulation time,
+reset it, swap the state of its model, configure warm starts, and save and
+restore snapshots. Clones are made by restoring a snapshot::
+
+    adapter = get_adapter('biosimulators_tellurium')
+    snapshot = adapter.save_snapshot(preprocessed_task)
+    clone = adapter.restore_snapshot(snapshot)
+
+A snapshot is picklable, and shares no native state with the task it was
+saved from.
+
+Stepping advances the solver instead of re-running the SED task from its
+initial time, so the integrator stays alive between steps of a time course::
+
+    adapter.step(preprocessed_task, changes, variables, start_time, interval, reset)
+
+applies the ModelAttributeChanges, advances the solver by interval from
+start_time, and returns {variable id: numpy array of values} with the last
+value at index -1. The integrator is reinitialized only if reset is True.
+"""
+
+import copy
+
+import numpy as np
+
+
+class BiosimulatorAdapter:
+    """ The native state handling of a biosimulator api
+
+    Attributes:
+        can_step (bool): the api supports step and reset.
+        can_swap_state (bool): the api supports get_state and set_state, so that one model
+            can step many variants by swapping their states.
+    """
+    can_step = False
+    can_swap_state = False
+
+    def step(self, preprocessed_task, changes, variables, start_time, interval, reset):
+        raise NotImplementedError
+
+    def reset(self, preprocessed_task):
+        """ return a preprocessed task's model to its initial conditions """
+        pass
+
+    def get_state(self, preprocessed_task):
+        raise NotImplementedError
+
+    def set_state(self, preprocessed_task, state):
+        raise NotImplementedError
+
+    def warm_start(self, preprocessed_task):
+        """ configure warm starts for a preprocessed task, returns False if they are not supported """
+        return False
+
+    def save_snapshot(self, preprocessed_task):
+        raise NotImplementedError
+
+    def restore_snapshot(self, snapshot):
+        raise NotImplementedError
+
+    def clone(self, preprocessed_task):
+        """ clone a preprocessed task by restoring a snapshot of it """
+        return self.restore_snapshot(self.save_snapshot(preprocessed_task))
+
+
+def get_tellurium_independent_indices(road_runner):
+    """ get the indices of the global parameters and compartments that are not set by assignment rules """
+    model = road_runner.model
+    assignment_rule_ids = set(road_runner.getAssignmentRuleIds())
+    parameter_indices = np.array([
+        index for index, parameter_id in enumerate(model.getGlobalParameterIds())
+        if parameter_id not in assignment_rule_ids], dtype=np.int32)
+    compartment_indices = np.array([
+        index for index, compartment_id in enumerate(model.getCompartmentIds())
+        if compartment_id not in assignment_rule_ids], dtype=np.int32)
+    return parameter_indices, compartment_indices
+
+
+class TelluriumAdapter(BiosimulatorAdapter):
+    """ The native state handling of biosimulators_tellurium, through the task's roadrunner """
+    can_step = True
+    can_swap_state = True
+
+    def step(self, preprocessed_task, changes, variables, start_time, interval, reset):
+        """ advance the task with roadrunner's oneStep """
+        road_runner = preprocessed_task.road_runner
+
+        # apply model changes
+        for change in changes:
+            component_id = preprocessed_task.model_change_target_tellurium_id_map[change.target]
+            road_runner.model[component_id] = float(change.new_value)
+
+        road_runner.oneStep(start_time, interval, reset)
+
+        # the selections are ordered as the variables
+        values = road_runner.getSelectedValues()
+        return {
+            variable.id: np.array([value])
+            for variable, value in zip(variables, values)
+        }
+
+    def reset(self, preprocessed_task):
+        preprocessed_task.road_runner.reset()
+
+    def get_state(self, preprocessed_task):
+        """
+        get the state of the task's model as an array: the floating species amounts, the rate rule
+        values, and the global parameters and compartment volumes that inputs can change
+        """
+        model = preprocessed_task.road_runner.model
+        parameter_indices, compartment_indices = get_tellurium_independent_indices(
+            preprocessed_task.road_runner)
+        rate_rule_values = [model.getValue(symbol) for symbol in model.getRateRuleSymbols()]
+        return np.concatenate([
+            model.getFloatingSpeciesAmounts(),
+            rate_rule_values,
+            model.getGlobalParameterValues(parameter_indices) if len(parameter_indices) else [],
+            model.getCompartmentVolumes(compartment_indices) if len(compartment_indices) else [],
+        ])
+
+    def set_state(self, preprocessed_task, state):
+        """ set the state of the task's model from an array made by get_state """
+        model = preprocessed_task.road_runner.model
+        parameter_indices, compartment_indices = get_tellurium_independent_indices(
+            preprocessed_task.road_runner)
+        n_species = model.getNumFloatingSpecies()
+        rate_rule_symbols = model.getRateRuleSymbols()
+        n_dynamic = n_species + len(rate_rule_symbols)
+        n_parameters = len(parameter_indices)
+
+        # parameters and volumes first, since the species amounts and rate rules are set on top of them
+        if n_parameters:
+            model.setGlobalParameterValues(parameter_indices, state[n_dynamic:n_dynamic + n_parameters])
+        if len(compartment_indices):
+            model.setCompartmentVolumes(compartment_indices, state[n_dynamic + n_parameters:])
+        model.setFloatingSpeciesAmounts(state[:n_species])
+        for symbol, value in zip(rate_rule_symbols, state[n_species:n_dynamic]):
+            model.setValue(symbol, value)
+
+    def save_snapshot(self, preprocessed_task):
+        """ snapshot the task with its roadrunner state """
+        import roadrunner
+
+        task = copy.copy(preprocessed_task)
+        task.road_runner = None
+        task.solver = None
+        return {
+            'task': task,
+            'road_runner_state': preprocessed_task.road_runner.saveStateS(),
+            'time': preprocessed_task.road_runner.model.getTime(),
+            'integrator': isinstance(preprocessed_task.solver, roadrunner.Integrator),
+        }
+
+    def restore_snapshot(self, snapshot):
+        import roadrunner
+
+        road_runner = roadrunner.RoadRunner()
+        road_runner.loadStateS(snapshot['road_runner_state'])
+        task = copy.copy(snapshot['task'])
+        task.road_runner = road_runner
+
+        # the saved state does not keep the model's time or the integrator's history
+        road_runner.model.setTime(snapshot['time'])
+        if snapshot['integrator']:
+            task.solver = road_runner.getIntegrator()
+            task.solver.restart(snapshot['time'])
+        else:
+            task.solver = road_runner.getSteadyStateSolver()
+        return task
+
+
+def get_glpk_basis(cobra_model):
+    """ get the row and column statuses of a glpk problem's basis, returns None for other solvers """
+    if cobra_model.solver.interface.__name__ != 'optlang.glpk_interface':
+        return None
+    import swiglpk
+
+    problem = cobra_model.solver.problem
+    return (
+        [swiglpk.glp_get_row_stat(problem, index)
+         for index in range(1, swiglpk.glp_get_num_rows(problem) + 1)],
+        [swiglpk.glp_get_col_stat(problem, index)
+         for index in range(1, swiglpk.glp_get_num_cols(problem) + 1)],
+    )
+
+
+def set_glpk_basis(cobra_model, basis):
+    import swiglpk
+
+    problem = cobra_model.solver.problem
+    row_statuses, column_statuses = basis
+    for index, status in enumerate(row_statuses, 1):
+        swiglpk.glp_set_row_stat(problem, index, status)
+    for index, status in enumerate(column_statuses, 1):
+        swiglpk.glp_set_col_stat(problem, index, status)
+
+
+class CobrapyAdapter(BiosimulatorAdapter):
+    """ The native state handling of biosimulators_cobrapy, through the task's cobra model """
+
+    def warm_start(self, preprocessed_task):
+        """
+        keep the basis of the task's solver between solves, by turning off presolve (which discards
+        the basis) and using the dual simplex. Between steps only a few bounds usually change, so
+        the previous basis stays dual feasible and takes a handful of pivots to re-optimize.
+        """
+        cobra_model = preprocessed_task['model']['model']
+        configuration = cobra_model.solver.configuration
+        configuration.presolve = False
+
+        if hasattr(configuration, 'lp_method'):
+            # cplex, gurobi
+            configuration.lp_method = 'dual'
+        elif hasattr(configuration, '_smcp'):
+            # glpk, falls back to the primal simplex if the dual simplex fails
+            import swiglpk
+            configuration._smcp.meth = swiglpk.GLP_DUALP
+        return True
+
+    def save_snapshot(self, preprocessed_task):
+        """
+        snapshot the task with a copy of its cobra model and the LP basis.
+        The method properties hold lambdas, so only their KiSAO id is saved.
+        """
+        model_info = preprocessed_task['model']
+        cobra_model = model_info['model']
+        simulation = preprocessed_task['simulation']
+        return {
+            'model_info': {
+                key: value for key, value in model_info.items()
+                if key not in ('model', 'model_change_obj_attr_map')},
+            'cobra_model': cobra_model.copy(),
+            'model_changes': {
+                target: (model_obj.id, attr_name)
+                for target, (model_obj, attr_name) in model_info['model_change_obj_attr_map'].items()},
+            'basis': get_glpk_basis(cobra_model),
+            'algorithm_kisao_id': simulation['algorithm_kisao_id'],
+            'method_kw_args': simulation['method_kw_args'],
+        }
+
+    def restore_snapshot(self, snapshot):
+        from biosimulators_cobrapy.data_model import KISAO_ALGORITHMS_PARAMETERS_MAP
+
+        cobra_model = snapshot['cobra_model']
+        if snapshot['basis'] is not None:
+            set_glpk_basis(cobra_model, snapshot['basis'])
+
+        # point the model changes at the restored reactions
+        model_change_obj_attr_map = {
+            target: (cobra_model.reactions.get_by_id(reaction_id), attr_name)
+            for target, (reaction_id, attr_name) in snapshot['model_changes'].items()
+        }
+
+        algorithm_kisao_id = snapshot['algorithm_kisao_id']
+        return {
+            'model': {
+                **snapshot['model_info'],
+                'model': cobra_model,
+                'model_change_obj_attr_map': model_change_obj_attr_map,
+            },
+            'simulation': {
+                'algorithm_kisao_id': algorithm_kisao_id,
+                'method_props': KISAO_ALGORITHMS_PARAMETERS_MAP[algorithm_kisao_id],
+                'method_kw_args': snapshot['method_kw_args'],
+            },
+        }
+
+
+ADAPTERS = {
+    'biosimulators_tellurium': TelluriumAdapter(),
+    'biosimulators_cobrapy': CobrapyAdapter(),
+}
+
+
+def get_adapter(biosimulator_api):
+    """ get the adapter for a biosimulator api, returns None if it is not supported """
+    return ADAPTERS.get(biosimulator_api)
@@ -0,0 +1,36 @@
+"""
+===========
+Checkpoints
+===========
+
+Save a ``Biosimulator`` to a compact on-disk checkpoint, and restore it without
+parsing the model, preprocessing the task, or running the initial state.
+
+A checkpoint holds the model's variables and maps, a snapshot of the native
+solver state of the preprocessed task from the biosimulator api's adapter
+(see ``vivarium_biosimulators.library.adapters``), the input values last
+applied to the model, and the simulation time.
+"""
+
+import zlib
+import pickle
+
+
+CHECKPOINT_VERSION = 1
+
+
+def write_checkpoint(path, checkpoint):
+    """ write a checkpoint dict to path, compressed """
+    data = pickle.dumps({**checkpoint, 'version': CHECKPOINT_VERSION}, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(path, 'wb') as checkpoint_file:
+        checkpoint_file.write(zlib.compress(data, 1))
+
+
+def read_checkpoint(path):
+    with open(path, 'rb') as checkpoint_file:
+        checkpoint = pickle.loads(zlib.decompress(checkpoint_file.read()))
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(
+            f"checkpoint {path} has version {checkpoint.get('version')}, "
+            f"expected {CHECKPOINT_VERSION}")
+    return checkpoint
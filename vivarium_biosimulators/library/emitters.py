@@ -0,0 +1,317 @@
+"""
+========
+Emitters
+========
+
+``ColumnarEmitter`` writes the emitted history to disk as it runs, with one
+column per emitted variable, so that long runs with many outputs keep a
+bounded amount of data in memory. Importing vivarium_biosimulators.library
+registers it as the ``'columnar'`` emitter type::
+
+    Engine(..., emitter={'type': 'columnar', 'path': 'out/experiment'})
+
+Emits are buffered for chunk_size rows, and each chunk of a numeric column
+is appended to the column's binary file. A column whose values do not change
+over a chunk is recorded as a constant in the manifest instead. Columns are
+read back with ``ColumnarReader``, as memory maps when they have no constant
+segments, so that a few variables can be loaded without reading the rest.
+
+Values that are not numeric, or whose shape changes, are kept in pickled
+object chunks.
+"""
+
+import os
+import json
+import pickle
+from numbers import Number
+
+import numpy as np
+
+from vivarium.core.emitter import Emitter
+from vivarium.library.topology import assoc_path
+
+
+MANIFEST_FILE = 'manifest.json'
+PATH_SEPARATOR = '/'
+
+
+def flatten_data(data, path=()):
+    """ flatten nested dicts to {path tuple: leaf value} """
+    flat = {}
+    for key, value in data.items():
+        key_path = path + (key,)
+        if isinstance(value, dict) and value:
+            flat.update(flatten_data(value, key_path))
+        else:
+            flat[key_path] = value
+    return flat
+
+
+def get_column_key(path):
+    return PATH_SEPARATOR.join(str(key) for key in path)
+
+
+def is_numeric(value):
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind in 'biuf'
+    return isinstance(value, Number) and not isinstance(value, complex)
+
+
+def merge_segment(segments, segment):
+    """ append a segment to a column's segments, merging it with the last one if they continue """
+    if segments:
+        last = segments[-1]
+        if last['start'] + last['length'] == segment['start'] and (
+                ('offset' in last and 'offset' in segment) or
+                ('value' in last and last.get('value') == segment.get('value'))):
+            last['length'] += segment['length']
+            return
+    segments.append(segment)
+
+
+class ColumnarEmitter(Emitter):
+    """ Write the emitted history to chunked columns on disk
+
+    Config:
+        - path (str): the directory of the columns, default is out/columnar/<experiment_id>.
+        - chunk_size (int): the number of emits buffered before they are written.
+        - float32 (bool): down-cast float64 columns to float32.
+        - compress_unchanged (bool): record a column that does not change over a chunk as a constant.
+        - embed_path (tuple): the path at which the emitted data is embedded.
+    """
+    def __init__(self, config):
+        super().__init__(config)
+        self.path = config.get('path') or os.path.join(
+            'out', 'columnar', str(config.get('experiment_id', 'experiment')))
+        self.chunk_size = config.get('chunk_size', 100)
+        self.float32 = config.get('float32', False)
+        self.compress_unchanged = config.get('compress_unchanged', True)
+        self.embed_path = tuple(config.get('embed_path', ()))
+        os.makedirs(self.path, exist_ok=True)
+
+        self.n_rows = 0
+        self.columns = {}
+        self.n_object_chunks = 0
+        self.buffer = []
+
+    def emit(self, data):
+        if data['table'] != 'history':
+            return
+        emit_data = data['data'].copy()
+        time = emit_data.pop('time', None)
+        row = flatten_data(assoc_path({}, self.embed_path, emit_data))
+        row[('time',)] = time
+        self.buffer.append(row)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def get_column(self, path, first_value):
+        """ get a column's manifest entry, adding the column on its first value """
+        key = get_column_key(path)
+        column = self.columns.get(key)
+        if column is None:
+            value = np.asarray(first_value)
+            column = {
+                'path': list(path),
+                'file': f'column_{len(self.columns)}.bin',
+                'segments': [],
+            }
+            if is_numeric(first_value):
+                dtype = value.dtype
+                if dtype.kind in 'iu':
+                    # integer values often become floats later in a run
+                    dtype = np.dtype(np.float64)
+                if self.float32 and dtype == np.float64:
+                    dtype = np.dtype(np.float32)
+                column.update({'dtype': dtype.str, 'shape': list(value.shape)})
+            self.columns[key] = column
+        return column
+
+    def flush(self):
+        """ write the buffered rows to the columns """
+        if not self.buffer:
+            return
+        start = self.n_rows
+        length = len(self.buffer)
+        paths = {}
+        for row in self.buffer:
+            for path, value in row.items():
+                paths.setdefault(path, value)
+
+        objects = {}
+        for path, first_value in paths.items():
+            column = self.get_column(path, first_value)
+            values = [row.get(path) for row in self.buffer]
+            if 'dtype' not in column or not self.write_numeric(column, values, start):
+                objects[column['file']] = (start, values)
+                column.setdefault('object_chunks', []).append(self.n_object_chunks)
+
+        if objects:
+            object_path = os.path.join(self.path, f'objects_{self.n_object_chunks}.pkl')
+            with open(object_path, 'wb') as object_file:
+                pickle.dump(objects, object_file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.n_object_chunks += 1
+
+        self.n_rows += length
+        self.buffer = []
+        self.write_manifest()
+
+    def write_numeric(self, column, values, start):
+        """ append values to a numeric column, returns False if they do not fit its dtype and shape """
+        shape = tuple(column['shape'])
+        if any(value is None or not is_numeric(value) or np.shape(value) != shape for value in values):
+            return False
+        array = np.asarray(values)
+        if not np.can_cast(array.dtype, column['dtype'], 'same_kind'):
+            return False
+        array = array.astype(column['dtype'])
+
+        if self.compress_unchanged and (array == array[0]).all():
+            merge_segment(column['segments'], {
+                'start': start, 'length': len(values), 'value': array[0].tolist()})
+            return True
+
+        with open(os.path.join(self.path, column['file']), 'ab') as column_file:
+            offset = column_file.tell()
+            column_file.write(np.ascontiguousarray(array).tobytes())
+        merge_segment(column['segments'], {
+            'start': start, 'length': len(values), 'offset': offset})
+        return True
+
+    def write_manifest(self):
+        manifest = {
+            'n_rows': self.n_rows,
+            'n_object_chunks': self.n_object_chunks,
+            'columns': self.columns,
+        }
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        with open(manifest_path + '.tmp', 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def get_reader(self):
+        self.flush()
+        return ColumnarReader(self.path)
+
+    def get_data(self, query=None):
+        return self.get_reader().get_data(query)
+
+    def get_timeseries(self, query=None):
+        return self.get_reader().get_timeseries(query)
+
+    def get_path_timeseries(self, query=None):
+        return self.get_reader().get_path_timeseries(query)
+
+
+class ColumnarReader:
+    """ Read the columns written by a ColumnarEmitter
+
+    Args:
+        path (str): the emitter's directory.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as manifest_file:
+            manifest = json.load(manifest_file)
+        self.n_rows = manifest['n_rows']
+        self.columns = manifest['columns']
+        self.object_chunks = {}
+
+    def get_paths(self, query=None):
+        """ get the paths of the columns, or of the columns under the paths in query """
+        paths = [tuple(column['path']) for column in self.columns.values()]
+        if query is None:
+            return paths
+        query = [tuple(path) for path in query]
+        return [
+            path for path in paths
+            if path == ('time',) or any(path[:len(prefix)] == prefix for prefix in query)]
+
+    def load_object_chunk(self, index):
+        if index not in self.object_chunks:
+            with open(os.path.join(self.path, f'objects_{index}.pkl'), 'rb') as object_file:
+                self.object_chunks[index] = pickle.load(object_file)
+        return self.object_chunks[index]
+
+    def read_segment(self, column, segment, data):
+        offset = segment['offset'] // data.dtype.itemsize
+        size = segment['length'] * int(np.prod(column['shape'], dtype=int))
+        return data[offset:offset + size].reshape(segment['length'], *column['shape'])
+
+    def read(self, path):
+        """
+        read a column as an array with one row per emit, memory mapped if it is all stored in
+        its file. Rows before the column was first emitted are NaN, or None for object columns.
+        """
+        column = self.columns[get_column_key(path)]
+        if 'object_chunks' in column or 'dtype' not in column:
+            return self.read_objects(column)
+
+        segments = column['segments']
+        dtype = np.dtype(column['dtype'])
+        shape = (self.n_rows, *column['shape'])
+        file_path = os.path.join(self.path, column['file'])
+        if len(segments) == 1 and 'offset' in segments[0] and segments[0]['length'] == self.n_rows:
+            return np.memmap(file_path, dtype=dtype, mode='r', shape=shape)
+
+        # constant segments, or rows where the column was not emitted
+        if sum(segment['length'] for segment in segments) == self.n_rows:
+            values = np.empty(shape, dtype=dtype)
+        else:
+            values = np.full(shape, np.nan, dtype=np.result_type(dtype, np.float32))
+        data = None
+        for segment in segments:
+            rows = slice(segment['start'], segment['start'] + segment['length'])
+            if 'value' in segment:
+                values[rows] = segment['value']
+                continue
+            if data is None:
+                data = np.memmap(file_path, dtype=dtype, mode='r')
+            values[rows] = self.read_segment(column, segment, data)
+        return values
+
+    def read_objects(self, column):
+        values = [None] * self.n_rows
+        data = None
+        for segment in column['segments']:
+            rows = slice(segment['start'], segment['start'] + segment['length'])
+            if 'value' in segment:
+                values[rows] = [segment['value']] * segment['length']
+                continue
+            if data is None:
+                data = np.memmap(os.path.join(self.path, column['file']), dtype=column['dtype'], mode='r')
+            values[rows] = list(self.read_segment(column, segment, data))
+        for index in column.get('object_chunks', []):
+            start, chunk_values = self.load_object_chunk(index)[column['file']]
+            values[start:start + len(chunk_values)] = chunk_values
+        return values
+
+    def get_path_timeseries(self, query=None):
+        """ get {path: column} for the queried columns, and the ('time',) column """
+        timeseries = {path: self.read(path) for path in self.get_paths(query) if path != ('time',)}
+        timeseries[('time',)] = self.read(('time',))
+        return timeseries
+
+    def get_timeseries(self, query=None):
+        """ get an embedded timeseries of the queried columns """
+        timeseries = {}
+        for path, values in self.get_path_timeseries(query).items():
+            timeseries = assoc_path(timeseries, path, values)
+        return timeseries
+
+    def get_data(self, query=None):
+        """ get the raw data, {time: emitted data}, which loads all queried columns into memory """
+        path_timeseries = self.get_path_timeseries(query)
+        times = path_timeseries.pop(('time',))
+        data = {}
+        for index, time in enumerate(np.asarray(times).tolist()):
+            emit = {}
+            for path, values in path_timeseries.items():
+                value = values[index]
+                if isinstance(value, np.ndarray) and value.ndim == 0:
+                    value = value.item()
+                elif isinstance(value, np.generic):
+                    value = value.item()
+                emit = assoc_path(emit, path, value)
+            data[time] = emit
+        return data
@@ -0,0 +1,129 @@
+"""
+=============
+Introspection
+=============
+
+Read a model's variable ids, targets, and namespaces, and the mapping from its
+inputs to its outputs, without preprocessing a task or running a simulation.
+The ids are the ones a ``Biosimulator`` gives its port variables. Results are
+kept in memory, keyed by the hash of the model file, and can also be stored
+on disk with a ``ModelVariablesCache``.
+"""
+
+from vivarium_biosimulators.library.model_cache import get_cache_key, get_model_variables
+
+
+# {cache key: model metadata}
+MODEL_METADATA = {}
+
+# input target attributes that set the initial value of an output
+INITIAL_VALUE_ATTRIBUTES = ['/@initialConcentration', '/@initialAmount', '/@value', '/@size']
+
+
+def get_input_ids(inputs, suggested_input_ids):
+    """ get {target: input id} for the inputs, with the suggested ids for inputs whose ids repeat """
+    repeat_ids = []
+    unique_ids = []
+    for variable in inputs:
+        variable_id = variable.id
+        if variable_id in repeat_ids:
+            continue
+        elif variable_id in unique_ids:
+            unique_ids.remove(variable_id)
+            repeat_ids.append(variable_id)
+        else:
+            unique_ids.append(variable_id)
+
+    return {
+        variable.target: suggested_input_ids[variable.target] if variable.id in repeat_ids else variable.id
+        for variable in inputs
+    }
+
+
+def get_simulation_type(simulation):
+    from biosimulators_utils.sedml.data_model import UniformTimeCourseSimulation, SteadyStateSimulation
+    if simulation == 'steady_state':
+        return SteadyStateSimulation
+    return UniformTimeCourseSimulation
+
+
+def get_input_output_map(inputs, outputs):
+    """ map the ids of inputs that set an initial value to the ids of the outputs with that target """
+    output_target_ids = {
+        output['target']: output_id
+        for output_id, output in outputs.items() if output['target']}
+    input_output_map = {}
+    for input_id, variable in inputs.items():
+        for attribute in INITIAL_VALUE_ATTRIBUTES:
+            if variable['target'] and variable['target'].endswith(attribute):
+                output_id = output_target_ids.get(variable['target'][:-len(attribute)])
+                if output_id is not None:
+                    input_output_map[input_id] = output_id
+                break
+    return input_output_map
+
+
+def get_model_metadata(
+        model_source,
+        model_language,
+        simulation='uniform_time_course',
+        kisao_id='KISAO_0000019',
+        biosimulator_api='biosimulators_tellurium',
+        cache=None,
+):
+    """ get a model's variables and their mapping, without building a Biosimulator
+
+    Args:
+        model_source (str): a path to the model file.
+        model_language (str): the model language.
+        simulation (str): the Biosimulator 'simulation' parameter.
+        kisao_id (str): the KISAO id of the simulation algorithm.
+        biosimulator_api (str): the name of the biosimulator api.
+        cache (ModelVariablesCache): an optional on-disk cache of the extracted variables.
+
+    Returns:
+        a dict with 'inputs' ({input id: {'target', 'target_namespaces', 'initial_value'}}),
+        'outputs' ({output id: {'target', 'symbol'}}), and 'input_output_map'
+        ({input id: output id} for inputs that set the initial value of an output).
+    """
+    simulation_type = get_simulation_type(simulation)
+    key = get_cache_key(model_source, biosimulator_api, simulation_type, kisao_id)
+    model_metadata = MODEL_METADATA.get(key)
+    if model_metadata is not None:
+        return model_metadata
+
+    model_variables = get_model_variables(
+        model_source=model_source,
+        model_language=model_language,
+        simulation_type=simulation_type,
+        kisao_id=kisao_id,
+        biosimulator_api=biosimulator_api,
+        cache=cache,
+    )
+    input_ids = get_input_ids(model_variables['inputs'], model_variables['suggested_input_ids'])
+    inputs = {
+        input_ids[variable.target]: {
+            'target': variable.target,
+            'target_namespaces': variable.target_namespaces,
+            'initial_value': variable.new_value,
+        } for variable in model_variables['inputs']
+    }
+    outputs = {
+        # the first output is time, as in Biosimulator.load_model
+        ('time' if index == 0 and not variable.id else variable.id): {
+            'target': variable.target,
+            'symbol': variable.symbol,
+        } for index, variable in enumerate(model_variables['outputs'])
+    }
+
+    model_metadata = {
+        'inputs': inputs,
+        'outputs': outputs,
+        'input_output_map': get_input_output_map(inputs, outputs),
+    }
+    MODEL_METADATA[key] = model_metadata
+    return model_metadata
+
+
+def clear_model_metadata():
+    MODEL_METADATA.clear()
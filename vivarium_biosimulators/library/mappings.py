@@ -1,36 +1,29 @@
 from biosimulators_utils.sedml.data_model import ModelLanguage
 
-from vivarium_biosimulators.processes.biosimulator_process import Biosimulator
+from vivarium_biosimulators.library.introspection import get_model_metadata
 
 
 def tellurium_mapping(
         model_source,
+        cache=None,
 ):
     """
-    get mapping of names between input and output ports
-    from a configured tellurium process
+    get mapping of names between input and output ports of a tellurium process,
+    from the inputs that set a species' initial concentration or amount to the
+    species' outputs. The model is not preprocessed or simulated.
     """
-    config = {
-        'biosimulator_api': 'biosimulators_tellurium',
-        'model_source': model_source,
-        'model_language': ModelLanguage.SBML.value,
-        'simulation': 'uniform_time_course',
+    model_metadata = get_model_metadata(
+        model_source=model_source,
+        model_language=ModelLanguage.SBML.value,
+        simulation='uniform_time_course',
+        biosimulator_api='biosimulators_tellurium',
+        cache=cache,
+    )
+    return {
+        input_id: output_id
+        for input_id, output_id in model_metadata['input_output_map'].items()
+        if model_metadata['inputs'][input_id]['target'].endswith(('@initialConcentration', '@initialAmount'))
     }
-    process = Biosimulator(config)
-    input_output_map = {}
-    for variable in process.inputs:
-        if variable.target and (
-                variable.target.endswith('@initialConcentration') or
-                variable.target.endswith('@initialAmount')
-        ):
-            input_name = variable.id
-            if 'init_conc_' in input_name:
-                output_name = input_name.replace('init_conc_', 'dynamics_')
-            elif 'init_amount_' in input_name:
-                output_name = input_name.replace('init_amount_', 'dynamics_')
-            input_output_map[input_name] = output_name
-
-    return input_output_map
 
 
 def remove_multi_update(d):
@@ -0,0 +1,199 @@
+"""
+=====================
+Model Variables Cache
+=====================
+
+A content-addressed, on-disk cache for the model changes and variables that
+``get_parameters_variables_outputs_for_simulation`` extracts from a model file.
+Entries are keyed by the hash of the model file, the biosimulator api, the
+simulation type, and the KISAO id of the algorithm, so that repeated builds of
+the same model skip parsing entirely.
+"""
+
+import os
+import hashlib
+import pickle
+
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser('~'), '.cache', 'vivarium_biosimulators', 'model_variables')
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024  # bytes
+
+
+def get_file_hash(path, block_size=2 ** 20):
+    """ sha256 of a file's contents """
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def get_cache_key(
+        model_source,
+        biosimulator_api,
+        simulation_type,
+        kisao_id,
+):
+    """ make a cache key from the model contents and the simulation that will run it """
+    if isinstance(simulation_type, type):
+        simulation_type = simulation_type.__name__
+    key = '|'.join([
+        str(CACHE_VERSION),
+        get_file_hash(model_source),
+        str(biosimulator_api),
+        str(simulation_type),
+        str(kisao_id),
+    ])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class ModelVariablesCache:
+    """ An on-disk cache of extracted model variables, with least-recently-used eviction
+
+    Args:
+        cache_dir (str): the directory that holds the cache entries.
+        max_size (int): the maximum total size of the cache in bytes. The least
+            recently used entries are evicted once this is exceeded.
+    """
+    suffix = '.pkl'
+
+    def __init__(self, cache_dir=None, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_size = max_size
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [
+            os.path.join(self.cache_dir, filename)
+            for filename in os.listdir(self.cache_dir)
+            if filename.endswith(self.suffix)
+        ]
+
+    def get(self, key):
+        """ return the cached value for key, or None on a miss """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # unreadable entry, drop it
+            self.invalidate(key)
+            return None
+
+        # mark as recently used
+        os.utime(path)
+        return value
+
+    def set(self, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """ remove the least recently used entries until the cache fits in max_size """
+        entries = []
+        for path in self.entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self._remove(path)
+            total_size -= size
+
+    def invalidate(self, key=None):
+        """ remove the entry for key, or every entry if key is None """
+        paths = [self.path(key)] if key else self.entries()
+        for path in paths:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def clear_model_cache(cache_dir=None):
+    """ invalidate every entry of the model variables cache """
+    ModelVariablesCache(cache_dir).invalidate()
+
+
+def get_model_variables(
+        model_source,
+        model_language,
+        simulation_type,
+        kisao_id,
+        biosimulator_api='',
+        cache=None,
+):
+    """ get the inputs and outputs of a model, and suggested ids for its inputs
+
+    Args:
+        model_source (str): a path to the model file.
+        model_language (str): the model language.
+        simulation_type (type): the class of the SED simulation.
+        kisao_id (str): the KISAO id of the simulation algorithm.
+        biosimulator_api (str): the name of the biosimulator api, used in the cache key.
+        cache (ModelVariablesCache): an optional cache to read from and write to.
+
+    Returns:
+        a dict with 'inputs' (list of ModelAttributeChange), 'outputs' (list of Variable),
+        and 'suggested_input_ids' ({target: suggested input id}).
+    """
+    key = None
+    if cache is not None:
+        key = get_cache_key(model_source, biosimulator_api, simulation_type, kisao_id)
+        model_variables = cache.get(key)
+        if model_variables is not None:
+            return model_variables
+
+    # biosimulators_utils is slow to import, and only needed on a cache miss
+    from biosimulators_utils.sedml.data_model import Task
+    from biosimulators_utils.sedml.model_utils import get_parameters_variables_outputs_for_simulation
+
+    inputs, _, outputs, _ = get_parameters_variables_outputs_for_simulation(
+        model_filename=model_source,
+        model_language=model_language,
+        simulation_type=simulation_type,
+        algorithm_kisao_id=kisao_id,
+        native_data_types=True,
+        native_ids=True,
+        change_level=Task,
+    )
+
+    # suggested input names, used for inputs with repeat ids
+    suggested_inputs, _, _, _ = get_parameters_variables_outputs_for_simulation(
+        model_filename=model_source,
+        model_language=model_language,
+        simulation_type=simulation_type,
+        algorithm_kisao_id=kisao_id,
+        change_level=Task,
+    )
+
+    model_variables = {
+        'inputs': inputs,
+        'outputs': outputs,
+        'suggested_input_ids': {
+            variable.target: variable.id for variable in suggested_inputs},
+    }
+    if cache is not None:
+        cache.set(key, model_variables)
+    return model_variables
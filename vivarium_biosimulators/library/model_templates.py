@@ -0,0 +1,93 @@
+"""
+===============
+Model Templates
+===============
+
+A process-wide registry of parsed and preprocessed models, so that many
+``Biosimulator`` instances with the same model configuration share the
+immutable parts (variables, target maps, initial values), and each get
+their own copy of the native solver state by cloning the preprocessed task
+with the biosimulator api's adapter.
+"""
+
+import os
+import json
+
+
+MODEL_TEMPLATES = {}
+
+# the parameters that determine a model template
+TEMPLATE_PARAMETERS = [
+    'biosimulator_api',
+    'model_source',
+    'model_language',
+    'simulation',
+    'algorithm',
+    'sed_task_config',
+    'time_step',
+    'number_of_points',
+    'output_variables',
+]
+
+
+class ModelTemplate:
+    """ The shareable parts of an initialized Biosimulator
+
+    Attributes:
+        inputs (list): the model's ModelAttributeChanges.
+        outputs (list): the model's Variables.
+        input_target_map (dict): {input id: target}.
+        input_target_namespace (dict): {input id: target namespaces}.
+        input_initial_value (dict): {input id: initial value}.
+        target_to_input_id (dict): {target: input id}.
+        preprocessed_task: the preprocessed task, which is cloned and never run directly.
+        initial_output_values (dict): {output id: initial value}.
+    """
+    def __init__(
+            self,
+            inputs,
+            outputs,
+            input_target_map,
+            input_target_namespace,
+            input_initial_value,
+            target_to_input_id,
+            preprocessed_task,
+            initial_output_values,
+    ):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.input_target_map = input_target_map
+        self.input_target_namespace = input_target_namespace
+        self.input_initial_value = input_initial_value
+        self.target_to_input_id = target_to_input_id
+        self.preprocessed_task = preprocessed_task
+        self.initial_output_values = initial_output_values
+
+
+def get_template_key(parameters):
+    """ make a registry key from a Biosimulator's model parameters and the model file's stat """
+    model_source = parameters['model_source']
+    try:
+        stat = os.stat(model_source)
+        source_stat = [os.path.abspath(model_source), stat.st_mtime_ns, stat.st_size]
+    except (OSError, TypeError):
+        source_stat = [model_source]
+    template_parameters = {
+        key: parameters.get(key) for key in TEMPLATE_PARAMETERS}
+    return json.dumps(
+        [source_stat, template_parameters],
+        sort_keys=True,
+        default=str,
+    )
+
+
+def get_model_template(key):
+    return MODEL_TEMPLATES.get(key)
+
+
+def register_model_template(key, template):
+    MODEL_TEMPLATES[key] = template
+
+
+def clear_model_templates():
+    MODEL_TEMPLATES.clear()
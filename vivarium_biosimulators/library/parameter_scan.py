@@ -0,0 +1,201 @@
+"""
+==============
+Parameter Scan
+==============
+
+Run a Biosimulator over many sets of input values, such as SBML parameters or
+FBA bounds, across a pool of subprocesses. Each subprocess builds and
+preprocesses the Biosimulator once, and then solves its share of the points.
+Results are appended to a JSON lines file as they finish, one record per
+point, so that memory stays bounded and a crashed scan resumes from the
+points it already finished::
+
+    points = make_grid_points({'lower_bound_reaction_R_EX_glc__D_e': [-10, -5, 0]})
+    run_parameter_scan(config, points, 'out/scan.jsonl')
+    results = read_scan_results('out/scan.jsonl')
+"""
+
+import os
+import sys
+import json
+import time
+import itertools
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from vivarium_biosimulators.library.workers import get_multiprocessing_context
+
+
+def make_grid_points(grid):
+    """ make the points of a grid, {input id: values}, as a list of {input id: value} """
+    input_ids = list(grid.keys())
+    return [
+        dict(zip(input_ids, values))
+        for values in itertools.product(*grid.values())
+    ]
+
+
+def make_sample_points(ranges, n_samples, seed=0):
+    """ sample points uniformly from {input id: (low, high)} """
+    rng = np.random.default_rng(seed)
+    samples = rng.uniform(
+        [low for low, _ in ranges.values()],
+        [high for _, high in ranges.values()],
+        size=(n_samples, len(ranges)))
+    return [dict(zip(ranges.keys(), sample.tolist())) for sample in samples]
+
+
+def to_json_value(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# the Biosimulator of a scan subprocess
+SCAN_PROCESS = None
+
+
+def init_scan_process(parameters):
+    from vivarium_biosimulators.processes.biosimulator_process import Biosimulator
+
+    global SCAN_PROCESS
+    SCAN_PROCESS = Biosimulator(parameters)
+
+
+def run_point(process, point, total_time):
+    """ solve the process from its initial state with the point's inputs, and return the final outputs """
+    # stateful stepping starts again from the initial conditions
+    process.stepping_started = False
+    process.simulation_time = 0.
+    inputs = {**process.input_initial_value, **point}
+    results = process.solve(inputs, total_time)
+    return dict(zip(process.output_ids, results))
+
+
+def run_points(indexed_points, total_time):
+    """ run the scan process on each (index, point), and return a record for each """
+    process = SCAN_PROCESS
+    records = []
+    for index, point in indexed_points:
+        record = {'index': index, 'inputs': point}
+        try:
+            outputs = run_point(process, point, total_time)
+            record['outputs'] = {output_id: to_json_value(value) for output_id, value in outputs.items()}
+        except Exception:
+            record['error'] = traceback.format_exc()
+        records.append(record)
+    return records
+
+
+def read_scan_results(path):
+    """ read the records of a scan, ordered by index. A partly written last line is skipped. """
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path) as results_file:
+        for line in results_file:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return sorted(records, key=lambda record: record['index'])
+
+
+def remove_partial_line(path):
+    """ truncate a results file after its last complete line, which a crash can leave partly written """
+    with open(path, 'rb+') as results_file:
+        data = results_file.read()
+        if data and not data.endswith(b'\n'):
+            results_file.truncate(data.rfind(b'\n') + 1)
+
+
+def print_progress(finished, total, elapsed):
+    print(f'scan: {finished}/{total} points, {elapsed:.1f}s', file=sys.stderr)
+
+
+def run_parameter_scan(
+        parameters,
+        points,
+        results_path,
+        total_time=1.,
+        n_processes=None,
+        chunk_size=4,
+        resume=True,
+        progress=print_progress,
+):
+    """ run a Biosimulator at each point in parallel, and stream the results to results_path
+
+    Args:
+        parameters (dict): the Biosimulator parameters.
+        points (list): a {input id: value} for each run, from make_grid_points or make_sample_points.
+        results_path (str): the JSON lines file of the results, with a record per point with keys
+            'index', 'inputs', and 'outputs', or 'error' if the run failed.
+        total_time (float): the simulated time of each run, as one interval from the initial state.
+        n_processes (int): the number of subprocesses, default is the number of cores.
+        chunk_size (int): the number of points sent to a subprocess at a time.
+        resume (bool): skip the points that results_path already has records for.
+        progress (callable): called as progress(finished, total, elapsed seconds) after each chunk.
+            None turns off progress reports.
+
+    Returns:
+        dict: the number of 'finished' points, of 'failed' points, and of 'resumed' points
+            that were already in results_path.
+    """
+    parameters = {**parameters, 'worker': False}
+    points = [{input_id: to_json_value(value) for input_id, value in point.items()} for point in points]
+
+    # the points that finished before a crash are not run again
+    finished_indices = set()
+    if resume and os.path.exists(results_path):
+        remove_partial_line(results_path)
+        for record in read_scan_results(results_path):
+            if record['index'] >= len(points) or record['inputs'] != points[record['index']]:
+                raise ValueError(
+                    f"{results_path} has results for different points, "
+                    f"use another results_path or resume=False")
+            finished_indices.add(record['index'])
+    elif not resume and os.path.exists(results_path):
+        os.remove(results_path)
+
+    remaining = [(index, point) for index, point in enumerate(points) if index not in finished_indices]
+    chunks = iter([remaining[start:start + chunk_size] for start in range(0, len(remaining), chunk_size)])
+    summary = {'finished': 0, 'failed': 0, 'resumed': len(finished_indices)}
+    if not remaining:
+        return summary
+
+    results_dir = os.path.dirname(results_path)
+    if results_dir:
+        os.makedirs(results_dir, exist_ok=True)
+
+    n_processes = n_processes or os.cpu_count()
+    start = time.perf_counter()
+    with open(results_path, 'a') as results_file, ProcessPoolExecutor(
+            max_workers=n_processes,
+            mp_context=get_multiprocessing_context(),
+            initializer=init_scan_process,
+            initargs=(parameters,),
+    ) as executor:
+        # keep a few chunks per subprocess in flight, so that memory does not grow with the scan
+        pending = set()
+        for chunk in itertools.islice(chunks, 2 * n_processes):
+            pending.add(executor.submit(run_points, chunk, total_time))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for record in future.result():
+                    results_file.write(json.dumps(record, default=str) + '\n')
+                    summary['failed' if 'error' in record else 'finished'] += 1
+                results_file.flush()
+                if progress is not None:
+                    progress(
+                        summary['finished'] + summary['failed'] + summary['resumed'],
+                        len(points),
+                        time.perf_counter() - start)
+                next_chunk = next(chunks, None)
+                if next_chunk is not None:
+                    pending.add(executor.submit(run_points, next_chunk, total_time))
+    return summary
@@ -0,0 +1,203 @@
+"""
+================
+Response Surface
+================
+
+A precomputed table of a steady state Biosimulator's outputs over a grid of a
+few of its inputs, such as the exchange bounds that an ODE_FBA composite sets.
+The Biosimulator is sampled ahead of time in parallel, the table is saved to
+disk, and at run time the outputs are interpolated from the table instead of
+solving the task. Inputs outside of the grid, or inputs other than the gridded
+ones that differ from their sampled values, fall back to a real solve.
+"""
+
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from vivarium_biosimulators.library.workers import get_multiprocessing_context
+
+
+class ResponseSurface:
+    """ Interpolate a steady state Biosimulator's outputs over a grid of inputs
+
+    Args:
+        grid (dict): {input id: increasing array of sampled values}.
+        values (array): the outputs at each grid point, of shape (*grid shape, number of outputs).
+        output_ids (list): the output ids, ordered as the last axis of values.
+        base_inputs (dict): {input id: value} of the other inputs when the grid was sampled.
+        error (array): the estimated largest absolute interpolation error of each output.
+
+    Attributes:
+        hits (int): the number of interpolated lookups.
+        fallbacks (int): the number of lookups outside of the domain, or next to a failed sample.
+    """
+    def __init__(self, grid, values, output_ids, base_inputs, error=None):
+        from scipy.interpolate import RegularGridInterpolator
+
+        self.grid = {input_id: np.asarray(axis, dtype=float) for input_id, axis in grid.items()}
+        self.input_ids = list(self.grid.keys())
+        self.values = np.asarray(values, dtype=float)
+        self.output_ids = list(output_ids)
+        self.base_inputs = base_inputs
+        self.error = np.zeros(len(self.output_ids)) if error is None else np.asarray(error)
+        self.lower = np.array([axis[0] for axis in self.grid.values()])
+        self.upper = np.array([axis[-1] for axis in self.grid.values()])
+        self.base_input_ids = list(base_inputs.keys())
+        self.base_input_values = np.array(list(base_inputs.values()), dtype=float)
+        self.get_base_inputs = itemgetter(*self.base_input_ids) if self.base_input_ids else None
+        self.interpolator = RegularGridInterpolator(
+            tuple(self.grid.values()), self.values, method='linear')
+        self.hits = 0
+        self.fallbacks = 0
+
+    def in_domain(self, inputs):
+        """ check that inputs are inside the grid, and that the other inputs have their sampled values """
+        point = np.array([inputs[input_id] for input_id in self.input_ids], dtype=float)
+        if np.any(point < self.lower) or np.any(point > self.upper):
+            return False
+        if self.get_base_inputs is None:
+            return True
+        try:
+            values = self.get_base_inputs(inputs)
+        except KeyError:
+            values = [
+                inputs.get(input_id, value)
+                for input_id, value in zip(self.base_input_ids, self.base_input_values)]
+        return bool(np.all(np.asarray(values) == self.base_input_values))
+
+    def interpolate(self, inputs):
+        """ interpolate the outputs, ordered as output_ids, at the gridded inputs """
+        point = [inputs[input_id] for input_id in self.input_ids]
+        return self.interpolator([point])[0]
+
+    def lookup(self, inputs):
+        """ interpolate the outputs at inputs, returns None if they need a real solve """
+        if self.in_domain(inputs):
+            values = self.interpolate(inputs)
+            # failed samples are NaN
+            if not np.isnan(values).any():
+                self.hits += 1
+                return values
+        self.fallbacks += 1
+        return None
+
+    def get_error(self):
+        return dict(zip(self.output_ids, self.error))
+
+    def save(self, path):
+        """ save to a .npz file of numeric and string arrays, with each axis as its own array """
+        axes = {f'axis_{index}': axis for index, axis in enumerate(self.grid.values())}
+        np.savez_compressed(
+            path,
+            input_ids=np.array(self.input_ids, dtype=str),
+            values=self.values,
+            output_ids=np.array(self.output_ids, dtype=str),
+            base_input_ids=np.array(self.base_input_ids, dtype=str),
+            base_input_values=self.base_input_values,
+            error=self.error,
+            **axes,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            input_ids = data['input_ids'].tolist()
+            grid = {input_id: data[f'axis_{index}'] for index, input_id in enumerate(input_ids)}
+            base_inputs = dict(zip(data['base_input_ids'].tolist(), data['base_input_values'].tolist()))
+            return cls(
+                grid=grid,
+                values=data['values'],
+                output_ids=data['output_ids'].tolist(),
+                base_inputs=base_inputs,
+                error=data['error'],
+            )
+
+
+# the Biosimulator of a sampling subprocess
+SAMPLING_PROCESS = None
+
+
+def init_sampling_process(parameters):
+    from vivarium_biosimulators.processes.biosimulator_process import Biosimulator
+
+    global SAMPLING_PROCESS
+    SAMPLING_PROCESS = Biosimulator(parameters)
+
+
+def solve_points(input_ids, points):
+    """ solve the sampling process at each point, and return an array of shape (points, outputs) """
+    process = SAMPLING_PROCESS
+    inputs = dict(process.input_initial_value)
+    results = []
+    for point in points:
+        inputs.update(zip(input_ids, point))
+        try:
+            results.append(process.solve(inputs, 1.))
+        except Exception:
+            # an infeasible point, lookups next to it fall back to a solve
+            results.append(np.full(len(process.output_ids), np.nan))
+    return np.array(results, dtype=float)
+
+
+def solve_parallel(parameters, input_ids, points, n_processes=None, chunk_size=16):
+    """ solve a Biosimulator at each point in parallel, with one Biosimulator per subprocess """
+    chunks = [points[index:index + chunk_size] for index in range(0, len(points), chunk_size)]
+    with ProcessPoolExecutor(
+            max_workers=n_processes,
+            mp_context=get_multiprocessing_context(),
+            initializer=init_sampling_process,
+            initargs=(parameters,),
+    ) as executor:
+        results = list(executor.map(solve_points, [input_ids] * len(chunks), chunks))
+    return np.concatenate(results)
+
+
+def sample_response_surface(
+        parameters,
+        grid,
+        n_processes=None,
+        n_validation_points=20,
+        seed=0,
+):
+    """ sample a steady state Biosimulator over a grid of its inputs
+
+    Args:
+        parameters (dict): the Biosimulator parameters.
+        grid (dict): {input id: increasing array of values to sample}.
+        n_processes (int): the number of sampling subprocesses, default is the number of cores.
+        n_validation_points (int): the number of random points inside the grid that are solved
+            and compared to the interpolation, for the error estimate.
+
+    Returns:
+        ResponseSurface
+    """
+    from vivarium_biosimulators.processes.biosimulator_process import Biosimulator
+
+    parameters = {**parameters, 'response_surface': None, 'worker': False}
+    process = Biosimulator(parameters)
+    input_ids = list(grid.keys())
+    axes = [np.asarray(grid[input_id], dtype=float) for input_id in input_ids]
+
+    # the grid points, and random points for validation
+    grid_points = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(axes))
+    rng = np.random.default_rng(seed)
+    validation_points = rng.uniform(
+        [axis[0] for axis in axes], [axis[-1] for axis in axes],
+        size=(n_validation_points, len(axes)))
+    points = np.concatenate([grid_points, validation_points])
+
+    results = solve_parallel(parameters, input_ids, points, n_processes)
+    values = results[:len(grid_points)].reshape(*[len(axis) for axis in axes], -1)
+
+    base_inputs = {
+        input_id: value for input_id, value in process.input_initial_value.items()
+        if input_id not in grid}
+    surface = ResponseSurface(grid, values, process.output_ids, base_inputs)
+
+    # estimate the interpolation error from the validation points
+    if n_validation_points:
+        interpolated = surface.interpolator(validation_points)
+        surface.error = np.nanmax(np.abs(interpolated - results[len(grid_points):]), axis=0)
+    return surface
@@ -0,0 +1,66 @@
+"""
+============
+Result Cache
+============
+
+A bounded, least recently used cache of steady state results, keyed by the
+input values quantized to a tolerance. Steady state Biosimulators often see
+the same or nearly the same inputs step after step, and a cache hit skips
+exec_sed_task entirely.
+"""
+
+from numbers import Real
+from collections import OrderedDict
+
+
+class ResultCache:
+    """ An LRU cache of results keyed by quantized inputs
+
+    Args:
+        max_size (int): the largest number of cached results.
+        tolerance (float): inputs are quantized to multiples of tolerance.
+            With 0, only identical inputs share a result.
+    """
+    def __init__(self, max_size, tolerance=0.):
+        self.max_size = max_size
+        self.tolerance = tolerance
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, input_values):
+        """ make a key from an iterable of input values """
+        if not self.tolerance:
+            return tuple(input_values)
+        return tuple(
+            round(value / self.tolerance) if isinstance(value, Real) else value
+            for value in input_values
+        )
+
+    def get(self, key):
+        """ get a result and mark it as recently used, returns None on a miss """
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.results.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def set(self, key, result):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.results),
+        }
+
+    def clear(self):
+        self.results.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,78 @@
+"""
+======
+Timing
+======
+
+Accumulate the time spent in, and the number of calls to, the named phases of
+a Biosimulator step. Phases are chained, each starting when the previous one
+ended::
+
+    start = timer.clock()
+    ...  # build the model changes
+    start = timer.record('changes', start)
+    ...  # execute the task
+    timer.record('exec', start)
+
+``NullTimer`` has the same methods and records nothing, so instrumented code
+costs a few no-op calls when timing is off.
+"""
+
+import time
+
+
+class PhaseTimer:
+    """ Accumulated times and counts for named phases """
+    def __init__(self):
+        self.times = {}
+        self.counts = {}
+
+    def clock(self):
+        return time.perf_counter()
+
+    def record(self, phase, start):
+        """ add the time since start to phase, and return the current clock """
+        now = time.perf_counter()
+        self.times[phase] = self.times.get(phase, 0.) + now - start
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+        return now
+
+    def count(self, name, n=1):
+        """ add n to a counter that is not timed """
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def get_timings(self):
+        """
+        Returns:
+            dict: {phase: {'time': total seconds, 'count': calls, 'mean': seconds per call}},
+                and {name: {'count': n}} for counters.
+        """
+        timings = {}
+        for name, count in self.counts.items():
+            if name in self.times:
+                total = self.times[name]
+                timings[name] = {'time': total, 'count': count, 'mean': total / count}
+            else:
+                timings[name] = {'count': count}
+        return timings
+
+    def reset(self):
+        self.times.clear()
+        self.counts.clear()
+
+
+class NullTimer:
+    """ A PhaseTimer that records nothing """
+    def clock(self):
+        return 0.
+
+    def record(self, phase, start):
+        return 0.
+
+    def count(self, name, n=1):
+        pass
+
+    def get_timings(self):
+        return {}
+
+    def reset(self):
+        pass
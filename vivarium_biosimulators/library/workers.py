@@ -0,0 +1,178 @@
+"""
+=======
+Workers
+=======
+
+Run a Biosimulator's preprocessed task in a long-lived worker subprocess.
+Only the inputs that changed since the previous step are sent to the worker,
+and the worker writes its results to an array in shared memory, so that large
+results are not pickled. Since sending a step to the worker does not block,
+several Biosimulators in one composite can solve concurrently across cores.
+
+On linux, workers are forked from a fork server that has already imported
+vivarium_biosimulators and the biosimulator apis, so that only the first
+worker pays for the imports. Call ``prewarm_workers`` early in a program to
+start the fork server and its imports in the background.
+"""
+
+import sys
+import weakref
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# the modules that the fork server imports before it forks workers
+PRELOAD_MODULES = ['__main__', 'vivarium_biosimulators.processes.biosimulator_process']
+
+
+def get_multiprocessing_context():
+    # use the same start methods as vivarium's ParallelProcess
+    if sys.platform not in ('darwin', 'win32'):
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def preload_modules(module_names):
+    """ add modules for the fork server to import, before it starts """
+    for module_name in module_names:
+        if module_name not in PRELOAD_MODULES:
+            PRELOAD_MODULES.append(module_name)
+    context = get_multiprocessing_context()
+    if context.get_start_method() == 'forkserver':
+        context.set_forkserver_preload(PRELOAD_MODULES)
+
+
+def prewarm_workers(biosimulator_apis=()):
+    """
+    Start the fork server now, so that it imports vivarium_biosimulators and the biosimulator
+    apis in the background. Workers started later are forked with the modules already imported.
+    Returns False if the platform has no fork server.
+    """
+    preload_modules(biosimulator_apis)
+    context = get_multiprocessing_context()
+    if context.get_start_method() != 'forkserver':
+        return False
+    from multiprocessing import forkserver
+    forkserver.ensure_running()
+    return True
+
+
+def run_worker(connection, parameters, memory_name, n_outputs):
+    """ the worker's loop: build a Biosimulator, then run the commands received from the connection """
+    from vivarium_biosimulators.processes.biosimulator_process import Biosimulator
+
+    memory = shared_memory.SharedMemory(name=memory_name)
+    results = np.ndarray((n_outputs,), dtype=float, buffer=memory.buf)
+    process = None
+    try:
+        process = Biosimulator(parameters)
+        inputs = dict(process.input_initial_value)
+        connection.send(None)
+    except Exception as error:
+        connection.send(error)
+
+    # a worker that failed to build skips to the cleanup
+    running = process is not None
+    while running:
+        command, args = connection.recv()
+        try:
+            if command == 'end':
+                running = False
+                continue
+            elif command == 'step':
+                changed_inputs, interval = args
+                inputs.update(changed_inputs)
+                results[:] = process.solve(inputs, interval)
+            elif command == 'initial_output_values':
+                initial_output_values = process.get_initial_output_values()
+                results[:] = [initial_output_values[variable_id] for variable_id in process.output_ids]
+            else:
+                raise ValueError(f'unknown worker command {command}')
+            connection.send(None)
+        except Exception as error:
+            connection.send(error)
+
+    # release the array before closing the shared memory under it
+    del results
+    memory.close()
+    connection.close()
+
+
+def end_worker(connection, worker_process, memory):
+    try:
+        connection.send(('end', ()))
+    except (OSError, ValueError):
+        pass
+    worker_process.join(timeout=5)
+    if worker_process.is_alive():
+        worker_process.terminate()
+    connection.close()
+    try:
+        memory.close()
+    except BufferError:
+        # an array still views the memory, it is released with the array
+        pass
+    memory.unlink()
+
+
+class BiosimulatorWorker:
+    """ A worker subprocess that hosts a Biosimulator's preprocessed task
+
+    Args:
+        parameters (dict): the Biosimulator parameters for the worker's process.
+        n_outputs (int): the number of output variables, which must all be numeric.
+    """
+    def __init__(self, parameters, n_outputs):
+        # the first worker starts the fork server, which then has the api for later workers
+        preload_modules([parameters['biosimulator_api']])
+        context = get_multiprocessing_context()
+        self.memory = shared_memory.SharedMemory(create=True, size=max(n_outputs, 1) * 8)
+        self.results = np.ndarray((n_outputs,), dtype=float, buffer=self.memory.buf)
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=run_worker,
+            args=(child_connection, parameters, self.memory.name, n_outputs),
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+        self.applied_inputs = {}
+        self.pending = False
+        self._finalize = weakref.finalize(
+            self, end_worker, self.connection, self.process, self.memory)
+
+        # wait for the worker's Biosimulator
+        self.receive()
+
+    def receive(self):
+        error = self.connection.recv()
+        if error is not None:
+            raise error
+
+    def send_step(self, inputs, interval):
+        """ send the inputs that changed since the last step, without waiting for the results """
+        changed_inputs = {
+            variable_id: value for variable_id, value in inputs.items()
+            if variable_id not in self.applied_inputs
+            or self.applied_inputs[variable_id] != value
+        }
+        self.connection.send(('step', (changed_inputs, interval)))
+        self.applied_inputs.update(changed_inputs)
+        self.pending = True
+
+    def get_results(self):
+        """ wait for the pending step, and return a copy of its results """
+        self.pending = False
+        self.receive()
+        return self.results.copy()
+
+    def get_initial_output_values(self):
+        self.connection.send(('initial_output_values', ()))
+        self.receive()
+        return self.results.copy()
+
+    def end(self):
+        self.results = None
+        self._finalize()
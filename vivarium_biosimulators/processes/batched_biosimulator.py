@@ -0,0 +1,138 @@
+"""
+=====================
+Batched BioSimulator
+=====================
+
+``BatchedBiosimulator`` is a :term:`process class` that simulates N variants of
+the same model, which differ only in their input values, with one preprocessed
+model. Its ports are arrays with a batch dimension, of shape
+(batch_size, number of variables in the port).
+
+Steady state variants are solved one after another on the shared model, and
+only the inputs that differ from the previously solved variant are applied.
+Time course variants swap their model state, including the parameters that
+their inputs set, and the input values last applied to them, in and out of
+the shared model between steps, which requires an adapter that can step and swap the state of
+the biosimulator api's models (see ``vivarium_biosimulators.library.adapters``).
+"""
+
+import numpy as np
+
+from vivarium_biosimulators.processes.biosimulator_process import (
+    Biosimulator, TIME_COURSE_SIMULATIONS, get_delta, get_relative_change)
+
+
+class BatchedBiosimulator(Biosimulator):
+    """ A Biosimulator that advances a batch of model variants in each update
+
+    Config:
+        - batch_size (int): the number of variants.
+        - all other options are the same as Biosimulator's. All ports are array ports,
+            and 'incremental_changes' defaults to True. There is no worker or trajectory port.
+    """
+    defaults = {
+        **Biosimulator.defaults,
+        'batch_size': 1,
+        'incremental_changes': True,
+    }
+
+    def __init__(self, parameters=None):
+        parameters = {
+            **(parameters or {}),
+            'array_ports': True,
+            'worker': False,
+            'trajectory_port': None,
+        }
+        if parameters.get('simulation', self.defaults['simulation']) in TIME_COURSE_SIMULATIONS:
+            parameters['stateful_stepping'] = True
+        super().__init__(parameters)
+
+        self.batch_size = self.parameters['batch_size']
+
+        # time course variants swap their state in and out of the shared model
+        if self.stepper is not None and not self.adapter.can_swap_state:
+            raise ValueError(
+                f"BatchedBiosimulator does not support {self.parameters['biosimulator_api']} "
+                f"with simulation '{self.parameters['simulation']}'")
+        # (native state, applied input values, stepped values) of each variant
+        self.variant_states = [None] * self.batch_size
+
+    def make_port_state(self, port_id, values):
+        """ repeat the port's values for each variant """
+        row = super().make_port_state(port_id, values)
+        return np.tile(row, (self.batch_size, 1))
+
+    def get_batch_inputs(self, state):
+        """ get a {variable_id: value} dict of inputs for each variant """
+        batch_inputs = [{} for _ in range(self.batch_size)]
+        for port_id in self.input_ports:
+            variable_ids = self.port_assignments[port_id]
+            for input_values, row in zip(batch_inputs, state[port_id]):
+                input_values.update(zip(variable_ids, row))
+        return batch_inputs
+
+    def step_variant(self, index, inputs, interval):
+        """
+        swap in a variant's state and the input and output values last recorded for it,
+        advance it, and save its new state
+        """
+        variant_state = self.variant_states[index]
+        if variant_state is None:
+            # start from the initial conditions, and apply all inputs
+            self.adapter.reset(self.preprocessed_task)
+            self.applied_input_values = {}
+            self.stepped_values = {}
+        else:
+            native_state, applied_input_values, stepped_values = variant_state
+            self.adapter.set_state(self.preprocessed_task, native_state)
+            self.applied_input_values = dict(applied_input_values)
+            self.stepped_values = dict(stepped_values)
+
+        start = self.timer.clock()
+        changed_input_ids = self.get_changed_inputs(inputs)
+        changes = self.get_model_changes(inputs, changed_input_ids)
+        self.timer.count('changed_inputs', len(changes))
+        start = self.timer.record('changes', start)
+
+        # the integrator always restarts, since its history belongs to the previous variant
+        raw_results = self.advance(changes, interval, True)
+        self.timer.record('exec', start)
+        self.record_applied_inputs(inputs, changed_input_ids)
+        self.record_stepped_outputs(raw_results)
+        self.variant_states[index] = (
+            self.adapter.get_state(self.preprocessed_task), self.applied_input_values, self.stepped_values)
+        return raw_results
+
+    def next_update(self, interval, state):
+
+        # run each variant on the shared model
+        results = []
+        for index, inputs in enumerate(self.get_batch_inputs(state)):
+            if self.stepper is None:
+                results.append(self.solve(inputs, interval))
+                continue
+            raw_results = self.step_variant(index, inputs, interval)
+            start = self.timer.clock()
+            results.append(self.gather_results(raw_results))
+            self.timer.record('results', start)
+        results = np.array(results)
+        if self.stepper is not None:
+            self.simulation_time += interval
+
+        # one delta calculation per port for the whole batch
+        start = self.timer.clock()
+        update = {}
+        relative_change = 0.
+        for port_id in self.output_ports:
+            if not self.port_assignments[port_id]:
+                continue
+            values = results[:, self.output_port_positions[port_id]]
+            update[port_id] = get_delta(state[port_id], values)
+            if self.parameters['adaptive_time_step']:
+                relative_change = max(relative_change, get_relative_change(state[port_id], values))
+
+        if self.parameters['adaptive_time_step']:
+            self.adapt_time_step(interval, relative_change)
+        self.timer.record('deltas', start)
+        self.add_diagnostics(update)
+        return update
@@ -14,17 +14,28 @@ References:
 import importlib
 import copy
 
+import numpy as np
+
 from vivarium.core.process import Process
 
-from biosimulators_utils.config import Config
-from biosimulators_utils.sedml.data_model import (
-    Task, Algorithm, Model, ModelAttributeChange, ModelLanguage,
-    UniformTimeCourseSimulation, SteadyStateSimulation
+# biosimulators_utils and the biosimulator apis are imported when a Biosimulator is made
+from vivarium_biosimulators.library.model_cache import ModelVariablesCache, get_model_variables
+from vivarium_biosimulators.library.introspection import get_input_ids, get_input_output_map
+from vivarium_biosimulators.library.adapters import get_adapter
+from vivarium_biosimulators.library.workers import BiosimulatorWorker
+from vivarium_biosimulators.library.timing import PhaseTimer, NullTimer
+from vivarium_biosimulators.library.result_cache import ResultCache
+from vivarium_biosimulators.library.response_surface import ResponseSurface
+from vivarium_biosimulators.library.checkpoints import write_checkpoint, read_checkpoint
+from vivarium_biosimulators.library.model_templates import (
+    ModelTemplate, TEMPLATE_PARAMETERS, get_template_key, get_model_template, register_model_template,
 )
-from biosimulators_utils.sedml.model_utils import get_parameters_variables_outputs_for_simulation
 
 TIME_COURSE_SIMULATIONS = ['uniform_time_course', 'analysis']
 
+# the relative difference below which an input equals the stepped output it was set from
+STEPPED_VALUE_TOLERANCE = 1e-9
+
 
 def get_delta(before, after):
     # TODO -- make this work for BioNetGen, MCell.
@@ -32,6 +43,17 @@ def get_delta(before, after):
     return after - before
 
 
+def get_relative_change(before, after):
+    """ get the largest relative change between numeric arrays, ignoring NaNs """
+    before = np.asarray(before)
+    after = np.asarray(after)
+    if before.dtype.kind not in 'fiu' or after.dtype.kind not in 'fiu' or not after.size:
+        return 0.
+    scale = np.maximum(np.abs(before), np.abs(after))
+    change = np.abs(after - before) / np.where(scale > 0, scale, 1.)
+    return float(np.fmax.reduce(change, axis=None, initial=0.))
+
+
 def get_port_assignment(
         ports_dict,
         variables,
@@ -62,6 +84,33 @@ def get_port_assignment(
     return port_names, port_assignments
 
 
+def get_output_selection(parameters):
+    """ get the output ids to keep from the 'output_variables' parameter, None keeps all outputs """
+    output_variables = parameters['output_variables']
+    if output_variables != 'auto':
+        return output_variables
+    if parameters['default_output_port_name'] in parameters['emit_ports']:
+        return None
+    output_ports = parameters['output_ports'] or {}
+    output_selection = []
+    for variables in output_ports.values():
+        if isinstance(variables, str):
+            variables = [variables]
+        output_selection.extend(variables)
+    return output_selection
+
+
+def get_model_cache(model_cache):
+    """ get a ModelVariablesCache from the 'model_cache' parameter """
+    if not model_cache:
+        return None
+    if isinstance(model_cache, ModelVariablesCache):
+        return model_cache
+    if isinstance(model_cache, str):
+        return ModelVariablesCache(cache_dir=model_cache)
+    return ModelVariablesCache()
+
+
 class Biosimulator(Process):
     """ A Vivarium wrapper for any BioSimulator
 
@@ -78,6 +127,66 @@ class Biosimulator(Process):
         - algorithm (dict): the kwargs for biosimulators_utils.sedml.data_model.Algorithm.
         - sed_task_config (dict): the kwargs for biosimulators_utils.config.Config.
         - time_step (float): the synchronization time step.
+        - model_cache (bool, str, or ModelVariablesCache): cache the variables extracted from the model
+            on disk, keyed by the model file's hash. Use True for the default cache directory, or
+            a str for a specific directory.
+        - share_model_template (bool): share the parsed and preprocessed model between all Biosimulators
+            with the same model configuration. Each process gets a clone of the native solver state.
+        - incremental_changes (bool): only send the inputs that changed since they were last applied
+            to the model. Supported for 'steady_state', or with stateful_stepping. A time course that
+            re-runs from time 0 needs every input re-applied, since the task's run resets the species
+            that the inputs set.
+        - stateful_stepping (bool): keep the integrator alive and advance it from the current simulation
+            time on each step, instead of re-running the task from time 0. The integrator is only reset
+            when an input changes. An input that shares a store with the output it sets does not change
+            when only the model's dynamics moved it. Supported for 'uniform_time_course' with
+            biosimulators_tellurium.
+        - warm_start (bool): re-optimize each step from the optimal basis of the previous step's LP solve.
+            Supported for 'steady_state' with biosimulators_cobrapy.
+        - default_output_value: a declared default for the output variables in ports_schema. Without it,
+            ports_schema runs the task to get the initial output values, unless they are already known.
+        - array_ports (bool or list): ports whose variables are held in a single numpy array, rather than
+            one store per variable. Use True for all ports. The position of each variable is given by
+            port_index. Array ports need their own stores in the topology.
+        - worker (bool): host the preprocessed task in a long-lived worker subprocess. Only changed inputs
+            are sent to the worker and results return through shared memory, so Biosimulators in one
+            composite solve concurrently. All outputs must be numeric. End the worker with end_worker.
+        - adaptive_time_step (bool): adapt the time step returned by calculate_timestep, so that the largest
+            relative change of the numeric outputs over a step approaches relative_tolerance. A step is
+            never repeated, so a fast transient shrinks the following steps.
+        - min_time_step (float): the smallest adaptive time step, default is time_step / 100.
+        - max_time_step (float): the largest adaptive time step, default is time_step * 100.
+        - relative_tolerance (float): the target relative change of the outputs over one step.
+        - timing (bool): record the time and calls of each phase of a step: 'changes' (building the
+            model changes), 'exec' (exec_sed_task or the stepper), 'results' (gathering the results),
+            and 'deltas' (the update), and the number of 'changed_inputs'. In worker mode, the
+            'worker' phase is the wait for the worker's results. Construction records 'parse' (extracting
+            the model's variables), 'preprocess' (preprocess_sed_task), and 'initial_state' (making the
+            initial state). Get them with get_timings.
+        - diagnostics_port (str): the name of an emitted port for the timings, which turns timing on.
+        - number_of_points (int): the number of output points over each time course step, evenly spaced
+            and ending at the end of the step. The outputs are set from the last point.
+        - trajectory_port (str): the name of an emitted port for all points of the last step, as an
+            array of shape (number_of_points, number of outputs) with columns ordered as output_ids.
+            All outputs must be numeric. Not supported in worker mode.
+        - result_cache_size (int): cache up to this many 'steady_state' results, keyed by the input values.
+            A cache hit skips exec_sed_task. The hits and misses are in result_cache.stats().
+        - result_cache_tolerance (float): quantize the input values to multiples of this tolerance
+            for the result cache keys. With 0, only identical inputs hit the cache.
+        - response_surface (str or ResponseSurface): interpolate 'steady_state' outputs from a table sampled
+            over a few inputs with sample_response_surface, or from the path it was saved to. Inputs outside
+            of its domain are solved.
+        - output_variables (list or str): the ids of the output variables to record. Other outputs are not
+            passed to the biosimulator, and are not in any port. With 'auto', keep the variables in
+            output_ports, and all other outputs only if the default output port is in emit_ports.
+            None records all outputs.
+        - run_as_process (bool): run a 'steady_state' simulation as a process every time_step, rather
+            than as a step after the processes. Its updates then run alongside the other processes,
+            using the inputs from the start of the time step.
+        - checkpoint (str): the path to a checkpoint written by save_checkpoint. The model's variables and
+            the native solver state are restored from it instead of parsing and preprocessing the model,
+            and the process continues from the checkpoint's simulation time. The model parameters must
+            match the saved process'. initial_state returns the state saved with the checkpoint.
     """
     defaults = {
         'biosimulator_api': '',
@@ -96,16 +205,226 @@ class Biosimulator(Process):
             'LOG': False,
         },
         'time_step': 1.,
+        'model_cache': False,
+        'share_model_template': False,
+        'incremental_changes': False,
+        'stateful_stepping': False,
+        'warm_start': False,
+        'default_output_value': None,
+        'array_ports': False,
+        'worker': False,
+        'adaptive_time_step': False,
+        'min_time_step': None,
+        'max_time_step': None,
+        'relative_tolerance': 0.01,
+        'timing': False,
+        'diagnostics_port': None,
+        'number_of_points': 1,
+        'trajectory_port': None,
+        'result_cache_size': 0,
+        'result_cache_tolerance': 0.,
+        'response_surface': None,
+        'output_variables': None,
+        'run_as_process': False,
+        'checkpoint': None,
     }
 
     def __init__(self, parameters=None):
         super().__init__(parameters)
+        from biosimulators_utils.config import Config
+        from biosimulators_utils.sedml.data_model import ModelAttributeChange
+
+        # instrument the phases of each step
+        self.diagnostics_port = self.parameters['diagnostics_port']
+        if self.parameters['timing'] or self.diagnostics_port:
+            self.timer = PhaseTimer()
+        else:
+            self.timer = NullTimer()
 
         # import biosimulator module
         biosimulator = importlib.import_module(self.parameters['biosimulator_api'])
         self.exec_sed_task = getattr(biosimulator, 'exec_sed_task')
         self.preprocess_sed_task = getattr(biosimulator, 'preprocess_sed_task')
 
+        # the native state handling of the biosimulator api, None if it is not supported
+        self.adapter = get_adapter(self.parameters['biosimulator_api'])
+
+        # make the task
+        self.task = self.make_task()
+        self.sed_task_config = Config(
+            **self.parameters['sed_task_config'])
+
+        # the outputs to record, None for all outputs
+        self.output_selection = get_output_selection(self.parameters)
+
+        # get a shared model template for identical model configs
+        template = None
+        template_key = None
+        checkpoint = None
+        if self.parameters['checkpoint']:
+            checkpoint = read_checkpoint(self.parameters['checkpoint'])
+        elif self.parameters['share_model_template'] and not self.parameters['worker']:
+            template_key = get_template_key({
+                **self.parameters, 'output_variables': self.output_selection})
+            template = get_model_template(template_key)
+
+        self.model_template = template
+        if checkpoint is not None:
+            self.load_checkpoint_model(checkpoint)
+        elif template is not None:
+            self.load_model_template(template)
+        else:
+            self.load_model()
+
+        # re-optimize steady states from the previous solution's basis
+        if self.parameters['warm_start'] and self.preprocessed_task is not None:
+            if self.parameters['simulation'] != 'steady_state' or self.adapter is None or \
+                    not self.adapter.warm_start(self.preprocessed_task):
+                raise ValueError(
+                    f"warm_start is not supported for {self.parameters['biosimulator_api']} "
+                    f"with simulation '{self.parameters['simulation']}'")
+
+        # cache steady state results by their inputs
+        self.result_cache = None
+        if self.parameters['result_cache_size']:
+            if self.parameters['simulation'] != 'steady_state':
+                raise ValueError(
+                    f"result_cache_size requires simulation 'steady_state', "
+                    f"not '{self.parameters['simulation']}'")
+            self.result_cache = ResultCache(
+                self.parameters['result_cache_size'],
+                self.parameters['result_cache_tolerance'])
+
+        # preallocate a model change for each input
+        self.input_changes = {
+            variable_id: ModelAttributeChange(
+                target=target,
+                target_namespaces=self.input_target_namespace[variable_id],
+            ) for variable_id, target in self.input_target_map.items()
+        }
+        self.applied_input_values = {}
+        self.stepped_values = {}
+
+        # stateful stepping advances the native solver between steps
+        self.stepper = None
+        if self.parameters['stateful_stepping']:
+            if self.adapter is None or not self.adapter.can_step or \
+                    self.parameters['simulation'] not in TIME_COURSE_SIMULATIONS:
+                raise ValueError(
+                    f"stateful_stepping is not supported for {self.parameters['biosimulator_api']} "
+                    f"with simulation '{self.parameters['simulation']}'")
+            self.stepper = self.adapter.step
+        self.simulation_time = 0.
+        self.stepping_started = False
+        if self.parameters['incremental_changes'] and (
+                self.parameters['simulation'] != 'steady_state' and self.stepper is None):
+            raise ValueError(
+                f"incremental_changes is not supported for {self.parameters['biosimulator_api']} "
+                f"with simulation '{self.parameters['simulation']}' without stateful_stepping")
+        self.track_applied_inputs = self.parameters['incremental_changes'] or self.stepper is not None
+
+        # inputs that set an output's value, which a stepped model moves along with the output
+        self.stepped_input_output_map = {}
+        if self.stepper is not None:
+            self.stepped_input_output_map = get_input_output_map(
+                {variable_id: {'target': target} for variable_id, target in self.input_target_map.items()},
+                {variable.id: {'target': variable.target} for variable in self.outputs})
+
+        # the adaptive time step starts from time_step
+        self.time_step = self.parameters['time_step']
+        self.min_time_step = self.parameters['min_time_step'] or self.time_step / 100
+        self.max_time_step = self.parameters['max_time_step'] or self.time_step * 100
+
+        ####################
+        # Port Assignments #
+        ####################
+
+        # port assignments from parameters
+        default_input_port = self.parameters['default_input_port_name']
+        self.port_assignments = {}
+        self.input_ports, input_assignments = get_port_assignment(
+            self.parameters['input_ports'],
+            self.inputs,
+            default_input_port,
+            self.target_to_input_id,
+        )
+        self.port_assignments.update(input_assignments)
+        self.output_ports, output_assignments = get_port_assignment(
+            self.parameters['output_ports'],
+            self.outputs,
+            self.parameters['default_output_port_name'],
+        )
+        self.port_assignments.update(output_assignments)
+
+        # array ports hold all of their variables in one array, ordered by port_index
+        array_ports = self.parameters['array_ports']
+        if array_ports is True:
+            array_ports = list(self.port_assignments.keys())
+        self.array_ports = set(array_ports or [])
+        self.port_index = {
+            port_id: {variable_id: index for index, variable_id in enumerate(variables)}
+            for port_id, variables in self.port_assignments.items()
+        }
+
+        # positions of each output port's variables in the gathered results
+        self.output_ids = [variable.id for variable in self.outputs]
+        output_position = {variable_id: index for index, variable_id in enumerate(self.output_ids)}
+        self.output_port_positions = {
+            port_id: np.array(
+                [output_position[variable_id] for variable_id in self.port_assignments[port_id]],
+                dtype=int)
+            for port_id in self.output_ports
+        }
+
+        # interpolate steady state outputs from a precomputed table
+        self.response_surface = self.parameters['response_surface']
+        if self.response_surface is not None:
+            if self.parameters['simulation'] != 'steady_state':
+                raise ValueError(
+                    f"response_surface requires simulation 'steady_state', "
+                    f"not '{self.parameters['simulation']}'")
+            if not isinstance(self.response_surface, ResponseSurface):
+                self.response_surface = ResponseSurface.load(self.response_surface)
+            assert self.response_surface.output_ids == self.output_ids, \
+                "the response surface's outputs do not match the process' outputs"
+
+        # all points of the last time course step
+        self.trajectory_port = self.parameters['trajectory_port']
+        self.trajectory = None
+        if self.trajectory_port and (
+                self.parameters['worker'] or self.parameters['simulation'] not in TIME_COURSE_SIMULATIONS):
+            raise ValueError(
+                "trajectory_port requires a time course simulation, and is not supported in worker mode")
+
+        # host the preprocessed task in a worker subprocess
+        self.worker = None
+        self._worker_args = None
+        if self.parameters['worker']:
+            self.worker = BiosimulatorWorker(
+                {**self.parameters, 'worker': False},
+                len(self.output_ids))
+
+        # the initial state is made lazily, since it requires running the task
+        self.saved_initial_state = None
+
+        # continue from the checkpoint's runtime state
+        if checkpoint is not None:
+            self.applied_input_values = checkpoint['applied_input_values']
+            self.stepped_values = checkpoint['stepped_values']
+            self.simulation_time = checkpoint['simulation_time']
+            self.stepping_started = checkpoint['stepping_started']
+            self.time_step = checkpoint['time_step']
+            self.saved_initial_state = checkpoint['state']
+
+        if template is None and template_key is not None:
+            self.model_template = self.make_model_template()
+            register_model_template(template_key, self.model_template)
+
+    def make_task(self):
+        """ make the SED task from the model and simulation parameters """
+        from biosimulators_utils.sedml.data_model import (
+            Task, Algorithm, Model, UniformTimeCourseSimulation, SteadyStateSimulation)
+
         # get the model
         model = Model(
             id='model',
@@ -120,7 +439,7 @@ class Biosimulator(Process):
                 id='simulation',
                 initial_time=0.,
                 output_start_time=0.,
-                number_of_points=1,
+                number_of_points=self.parameters['number_of_points'],
                 output_end_time=self.parameters['time_step'],
                 algorithm=Algorithm(**self.parameters['algorithm']),
             )
@@ -130,72 +449,60 @@ class Biosimulator(Process):
                 algorithm=Algorithm(**self.parameters['algorithm']),
             )
 
-        # make the task
-        self.task = Task(
+        return Task(
             id='task',
             model=model,
             simulation=simulation,
         )
 
+    def load_model(self):
+        """ extract the model's variables and pre-process the task """
+        model = self.task.model
+        simulation = self.task.simulation
+
         # extract variables from the model
-        self.inputs, _, self.outputs, _ = get_parameters_variables_outputs_for_simulation(
-            model_filename=model.source,
+        start = self.timer.clock()
+        model_variables = get_model_variables(
+            model_source=model.source,
             model_language=model.language,
             simulation_type=simulation.__class__,
-            algorithm_kisao_id=simulation.algorithm.kisao_id,
-            native_data_types=True,
-            native_ids=True,
-            change_level=Task,
-            # model_language_options={
-            #     ModelLanguage.SBML: {
-            #         'include_reaction_fluxes_in_kinetic_simulation_variables': False,
-            #     }}
+            kisao_id=simulation.algorithm.kisao_id,
+            biosimulator_api=self.parameters['biosimulator_api'],
+            cache=get_model_cache(self.parameters['model_cache']),
         )
+        self.timer.record('parse', start)
+        self.inputs = model_variables['inputs']
+        self.outputs = model_variables['outputs']
 
         # TODO (ERAN) -- go through inputs and outputs, assign ids, use targets for meaning
         if not self.outputs[0].id:
             self.outputs[0].id = 'time'
 
+        # only record the selected outputs
+        if self.output_selection is not None:
+            all_output_ids = [variable.id for variable in self.outputs]
+            for variable_id in self.output_selection:
+                assert variable_id in all_output_ids, \
+                    f"'{variable_id}' is not in the available output ids: {all_output_ids}"
+            selected_ids = set(self.output_selection)
+            self.outputs = [variable for variable in self.outputs if variable.id in selected_ids]
+
         ###################################
         # Prepare model attribute changes #
         ###################################
 
-        # find unique and repeat input ids
-        repeat_ids = []
-        unique_ids = []
-        for variable in self.inputs:
-            variable_id = variable.id
-            if variable_id in repeat_ids:
-                continue
-            elif variable_id in unique_ids:
-                unique_ids.remove(variable_id)
-                repeat_ids.append(variable_id)
-            else:
-                unique_ids.append(variable_id)
-
-        # get suggested input names for repeat ids
-        suggested_inputs, _, _, _ = get_parameters_variables_outputs_for_simulation(
-            model_filename=model.source,
-            model_language=model.language,
-            simulation_type=simulation.__class__,
-            algorithm_kisao_id=simulation.algorithm.kisao_id,
-            change_level=Task,
-        )
-        target_to_suggested_input_ids = {
-            i.target: i.id for i in suggested_inputs}
+        # use the suggested input ids for inputs with repeat ids
+        input_ids = get_input_ids(self.inputs, model_variables['suggested_input_ids'])
 
         # make the map of input ids to targets
         self.input_target_map = {}
         self.input_target_namespace = {}
         self.input_initial_value = {}
-        target_to_input_id = {}
+        self.target_to_input_id = {}
         for variable in self.inputs:
-            variable_id = variable.id
+            variable_id = input_ids[variable.target]
             target = variable.target
-            if variable_id in repeat_ids:
-                # if repeat, then use suggested id
-                variable_id = target_to_suggested_input_ids[target]
-            target_to_input_id[target] = variable_id
+            self.target_to_input_id[target] = variable_id
             self.input_target_map[variable_id] = target
             self.input_target_namespace[variable_id] = variable.target_namespaces
             self.input_initial_value[variable_id] = variable.new_value
@@ -208,6 +515,17 @@ class Biosimulator(Process):
         for variable in self.outputs:
             variable.task = self.task
 
+        # a worker preprocesses its own task
+        self.preprocessed_task = None
+        if not self.parameters['worker']:
+            self.preprocessed_task = self.preprocess_task()
+        self.initial_output_values = None
+
+    def preprocess_task(self):
+        """ run the biosimulator's preprocess_sed_task with all the inputs as model changes """
+        from biosimulators_utils.sedml.data_model import ModelAttributeChange
+        start = self.timer.clock()
+
         # map inputs for pre-processing
         self.task.model.changes = []
         for variable in self.inputs:
@@ -217,42 +535,147 @@ class Biosimulator(Process):
             ))
 
         # pre-process
-        self.sed_task_config = Config(
-            **self.parameters['sed_task_config'])
-        self.preprocessed_task = self.preprocess_sed_task(
+        preprocessed_task = self.preprocess_sed_task(
             self.task,
             self.outputs,
             config=self.sed_task_config,
         )
+        self.timer.record('preprocess', start)
+        return preprocessed_task
 
-        ####################
-        # Port Assignments #
-        ####################
-
-        # port assignments from parameters
-        default_input_port = self.parameters['default_input_port_name']
-        self.port_assignments = {}
-        self.input_ports, input_assignments = get_port_assignment(
-            self.parameters['input_ports'],
-            self.inputs,
-            default_input_port,
-            target_to_input_id,
+    def make_model_template(self):
+        """ make a ModelTemplate from this process, to be shared by processes with the same model """
+        return ModelTemplate(
+            inputs=self.inputs,
+            outputs=self.outputs,
+            input_target_map=self.input_target_map,
+            input_target_namespace=self.input_target_namespace,
+            input_initial_value=self.input_initial_value,
+            target_to_input_id=self.target_to_input_id,
+            preprocessed_task=self.clone_preprocessed_task(self.preprocessed_task),
+            initial_output_values=self.initial_output_values,
         )
-        self.port_assignments.update(input_assignments)
-        self.output_ports, output_assignments = get_port_assignment(
-            self.parameters['output_ports'],
-            self.outputs,
-            self.parameters['default_output_port_name'],
-        )
-        self.port_assignments.update(output_assignments)
 
-        # pre-calculate initial state
-        # it is used to determine variable types in port_schema
-        self.saved_initial_state = self.make_initial_state()
+    def load_model_template(self, template):
+        """ share the template's variables and maps, and clone its preprocessed task """
+        self.inputs = template.inputs
+        self.outputs = template.outputs
+        self.input_target_map = template.input_target_map
+        self.input_target_namespace = template.input_target_namespace
+        self.input_initial_value = template.input_initial_value
+        self.target_to_input_id = template.target_to_input_id
+        self.initial_output_values = template.initial_output_values
+
+        self.preprocessed_task = self.clone_preprocessed_task(template.preprocessed_task)
+        if self.preprocessed_task is None:
+            self.preprocessed_task = self.preprocess_task()
+
+    def clone_preprocessed_task(self, preprocessed_task):
+        """ clone a preprocessed task with the adapter, returns None if the biosimulator api has no adapter """
+        if self.adapter is None or preprocessed_task is None:
+            return None
+        return self.adapter.clone(preprocessed_task)
+
+    def get_model_parameters(self):
+        """ get the parameters that determine the model, with the output variables resolved """
+        return {
+            key: self.output_selection if key == 'output_variables' else self.parameters[key]
+            for key in TEMPLATE_PARAMETERS
+        }
+
+    def save_checkpoint(self, path, state=None):
+        """
+        write the model's variables, the native solver state, the applied input values, and the
+        simulation time to path. Restore with the 'checkpoint' parameter.
+
+        Args:
+            path (str): the checkpoint file.
+            state (dict): the process' state, which the restored process returns from initial_state.
+        """
+        if self.adapter is None or self.preprocessed_task is None:
+            raise ValueError(
+                f"save_checkpoint is not supported for {self.parameters['biosimulator_api']}, "
+                f"or in worker mode")
+        write_checkpoint(path, {
+            'model_parameters': self.get_model_parameters(),
+            'inputs': self.inputs,
+            'outputs': self.outputs,
+            'input_target_map': self.input_target_map,
+            'input_target_namespace': self.input_target_namespace,
+            'input_initial_value': self.input_initial_value,
+            'target_to_input_id': self.target_to_input_id,
+            'initial_output_values': self.initial_output_values,
+            'snapshot': self.adapter.save_snapshot(self.preprocessed_task),
+            'applied_input_values': self.applied_input_values,
+            'stepped_values': self.stepped_values,
+            'simulation_time': self.simulation_time,
+            'stepping_started': self.stepping_started,
+            'time_step': self.time_step,
+            'state': state,
+        })
+
+    def load_checkpoint_model(self, checkpoint):
+        """ load the variables and maps, and restore the preprocessed task from a checkpoint """
+        model_parameters = self.get_model_parameters()
+        if checkpoint['model_parameters'] != model_parameters:
+            raise ValueError(
+                f"the checkpoint {self.parameters['checkpoint']} was saved with model parameters "
+                f"{checkpoint['model_parameters']}, not {model_parameters}")
+
+        self.inputs = checkpoint['inputs']
+        self.outputs = checkpoint['outputs']
+        self.input_target_map = checkpoint['input_target_map']
+        self.input_target_namespace = checkpoint['input_target_namespace']
+        self.input_initial_value = checkpoint['input_initial_value']
+        self.target_to_input_id = checkpoint['target_to_input_id']
+        self.initial_output_values = checkpoint['initial_output_values']
+        for variable in self.outputs:
+            variable.task = self.task
+
+        # a worker restores its own task
+        self.preprocessed_task = None
+        if not self.parameters['worker']:
+            self.preprocessed_task = self.adapter.restore_snapshot(checkpoint['snapshot'])
 
     def initial_state(self, config=None):
+        if self.saved_initial_state is None:
+            start = self.timer.clock()
+            self.saved_initial_state = self.make_initial_state()
+            self.timer.record('initial_state', start)
         return self.saved_initial_state
 
+    def get_initial_output_values(self):
+        """ get the output values at the initial time, running the task if they are not yet known """
+        if self.initial_output_values is None and self.model_template is not None:
+            self.initial_output_values = self.model_template.initial_output_values
+        if self.initial_output_values is None and self.worker is not None:
+            self.initial_output_values = dict(zip(
+                self.output_ids, self.worker.get_initial_output_values()))
+        elif self.initial_output_values is None:
+            results = self.run_task(
+                self.input_initial_value, self.parameters['time_step'])
+            self.initial_output_values = self.process_results(
+                results, time_course_index=0)
+
+            # share with processes that use the same model template
+            if self.model_template is not None and self.model_template.initial_output_values is None:
+                self.model_template.initial_output_values = self.initial_output_values
+        return self.initial_output_values
+
+    def get_output_defaults(self):
+        """
+        get default values of the output variables for ports_schema. These are the initial
+        output values if they are known, otherwise the declared default_output_value.
+        The task is only run if neither is available.
+        """
+        default_output_value = self.parameters['default_output_value']
+        if self.initial_output_values is None and default_output_value is not None:
+            return {
+                variable.id: default_output_value
+                for variable in self.outputs
+            }
+        return self.get_initial_output_values()
+
     def make_initial_state(self):
         """
         extract initial state according to port_assignments
@@ -262,60 +685,130 @@ class Biosimulator(Process):
         input_values = self.input_initial_value
 
         # get output_values
-        results = self.run_task(
-            input_values, self.parameters['time_step'])
-        output_values = self.process_results(
-            results, time_course_index=0)
+        output_values = self.get_initial_output_values()
 
         initial_state = {}
         for port_id, variables in self.port_assignments.items():
-            if port_id in self.input_ports:
-                initial_state[port_id] = {
-                    variable: input_values[variable]
-                    for variable in variables
-                }
-            elif port_id in self.output_ports:
-                initial_state[port_id] = {
-                    variable: output_values[variable]
-                    for variable in variables
-                }
+            values = output_values if port_id in self.output_ports else input_values
+            initial_state[port_id] = self.make_port_state(
+                port_id, {variable: values[variable] for variable in variables})
         return initial_state
 
+    def make_port_state(self, port_id, values):
+        """ convert a {variable_id: value} dict to the port's state, an array for array ports """
+        if port_id in self.array_ports:
+            return np.array(
+                [values[variable] for variable in self.port_assignments[port_id]],
+                dtype=float)
+        return values
+
+    def get_port_values(self, port_id, port_state):
+        """ convert a port's state to a {variable_id: value} dict """
+        if port_id in self.array_ports:
+            return dict(zip(self.port_assignments[port_id], port_state))
+        return port_state
+
     def is_deriver(self):
-        if self.parameters['simulation'] in TIME_COURSE_SIMULATIONS:
+        if self.parameters['simulation'] in TIME_COURSE_SIMULATIONS or self.parameters['run_as_process']:
             return False
         return True
 
     def ports_schema(self):
         """ make port schema for all ports and variables in self.port_assignments """
+        input_defaults = self.input_initial_value
+        output_defaults = self.get_output_defaults()
+
         schema = {}
         for port_id, variables in self.port_assignments.items():
             emit_port = port_id in self.parameters['emit_ports']
             updater_schema = {'_updater': 'accumulate'} if port_id in self.output_ports else {}
+            defaults = output_defaults if port_id in self.output_ports else input_defaults
+            if port_id in self.array_ports:
+                schema[port_id] = {
+                    '_default': self.make_port_state(port_id, defaults),
+                    '_emit': emit_port,
+                    **updater_schema,
+                }
+                continue
             schema[port_id] = {
                 variable: {
-                    '_default': self.saved_initial_state[port_id][variable],
+                    '_default': defaults[variable],
                     '_emit': emit_port,
                     **updater_schema,
                 } for variable in variables
             }
+        if self.diagnostics_port:
+            schema[self.diagnostics_port] = {
+                '_default': {},
+                '_updater': 'set',
+                '_emit': True,
+            }
+        if self.trajectory_port:
+            schema[self.trajectory_port] = {
+                '_default': np.zeros((self.parameters['number_of_points'], len(self.output_ids))),
+                '_updater': 'set',
+                '_emit': True,
+            }
         return schema
 
+    def input_changed(self, variable_id, variable_value):
+        """
+        check if an input differs from the value last applied to the model, and, for an input that sets
+        an output, from the output's last stepped value
+        """
+        if variable_id in self.applied_input_values and self.applied_input_values[variable_id] == variable_value:
+            return False
+        stepped_value = self.stepped_values.get(variable_id)
+        if stepped_value is not None:
+            # the store adds the stepped output back as a delta, which can round its last bit
+            return abs(variable_value - stepped_value) > STEPPED_VALUE_TOLERANCE * max(
+                abs(variable_value), abs(stepped_value))
+        return True
+
+    def get_changed_inputs(self, inputs):
+        """ get the ids of inputs whose values differ from the values last applied to the model """
+        if not self.track_applied_inputs:
+            return list(inputs.keys())
+        return [
+            variable_id for variable_id, variable_value in inputs.items()
+            if self.input_changed(variable_id, variable_value)
+        ]
+
+    def get_model_changes(self, inputs, variable_ids):
+        """ set the values of the preallocated model changes for variable_ids, and return them """
+        changes = []
+        for variable_id in variable_ids:
+            change = self.input_changes[variable_id]
+            change.new_value = inputs[variable_id]
+            changes.append(change)
+        return changes
+
+    def record_applied_inputs(self, inputs, variable_ids):
+        if self.track_applied_inputs:
+            for variable_id in variable_ids:
+                self.applied_input_values[variable_id] = inputs[variable_id]
+
+    def record_stepped_outputs(self, raw_results):
+        """
+        record the stepped values of the outputs that inputs set, so that an input that shares a store
+        with its output is not applied again when only the model's dynamics moved it
+        """
+        for input_id, output_id in self.stepped_input_output_map.items():
+            self.stepped_values[input_id] = raw_results[output_id][-1]
+
     def run_task(self, inputs, interval, initial_time=0.):
+        start = self.timer.clock()
 
-        # update model based on input
-        self.task.model.changes = []
-        for variable_id, variable_value in inputs.items():
-            self.task.model.changes.append(ModelAttributeChange(
-                target=self.input_target_map[variable_id],
-                new_value=variable_value,
-                target_namespaces=self.input_target_namespace[variable_id],
-            ))
+        # update model based on input, reusing the preallocated changes
+        changed_input_ids = self.get_changed_inputs(inputs)
+        self.task.model.changes = self.get_model_changes(inputs, changed_input_ids)
+        self.timer.count('changed_inputs', len(changed_input_ids))
 
         # set the simulation time
         self.task.simulation.initial_time = initial_time
         self.task.simulation.output_start_time = initial_time
         self.task.simulation.output_end_time = initial_time + interval
+        start = self.timer.record('changes', start)
 
         # execute step
         raw_results, log = self.exec_sed_task(
@@ -324,9 +817,74 @@ class Biosimulator(Process):
             preprocessed_task=self.preprocessed_task,
             config=self.sed_task_config,
         )
+        self.timer.record('exec', start)
+
+        # record the applied input values
+        self.record_applied_inputs(inputs, changed_input_ids)
 
         return raw_results
 
+    def step_task(self, inputs, interval):
+        """
+        advance the native solver by interval from the current simulation time,
+        resetting the integrator only if an input changed
+        """
+        start = self.timer.clock()
+
+        # start from the initial conditions on the first step, and apply all inputs
+        if not self.stepping_started:
+            self.adapter.reset(self.preprocessed_task)
+            self.applied_input_values = {}
+            self.stepped_values = {}
+
+        changed_input_ids = self.get_changed_inputs(inputs)
+        changes = self.get_model_changes(inputs, changed_input_ids)
+
+        reset = bool(changes) or not self.stepping_started
+        self.stepping_started = True
+        self.timer.count('changed_inputs', len(changes))
+        start = self.timer.record('changes', start)
+
+        raw_results = self.advance(changes, interval, reset)
+        self.timer.record('exec', start)
+        self.simulation_time += interval
+        self.record_applied_inputs(inputs, changed_input_ids)
+        self.record_stepped_outputs(raw_results)
+
+        return raw_results
+
+    def advance(self, changes, interval, reset):
+        """ advance the stepper by interval from the current simulation time, in number_of_points steps """
+        number_of_points = self.parameters['number_of_points']
+        if number_of_points == 1:
+            return self.stepper(
+                self.preprocessed_task, changes, self.outputs, self.simulation_time, interval, reset)
+
+        # step the stepper once per point, without resetting the integrator between points
+        sub_interval = interval / number_of_points
+        points = []
+        for point in range(number_of_points):
+            points.append(self.stepper(
+                self.preprocessed_task,
+                changes if point == 0 else [],
+                self.outputs,
+                self.simulation_time + point * sub_interval,
+                sub_interval,
+                reset and point == 0,
+            ))
+        return {
+            variable.id: np.concatenate([point[variable.id] for point in points])
+            for variable in self.outputs
+        }
+
+    def gather_trajectory(self, results):
+        """ gather the last number_of_points of all outputs into an array of shape (points, outputs) """
+        number_of_points = self.parameters['number_of_points']
+        return np.array([
+            np.asarray(results[variable_id], dtype=float)[-number_of_points:]
+            for variable_id in self.output_ids
+        ]).T
+
     def process_result(self, result, time_course_index=-1):
         if self.parameters['simulation'] in TIME_COURSE_SIMULATIONS:
             value = result[time_course_index]
@@ -334,33 +892,149 @@ class Biosimulator(Process):
             value = result
         return value
 
-    def process_results(self, results, time_course_index=-1):
-        values = {}
-        for result_id, result in results.items():
-            values[result_id] = self.process_result(result, time_course_index)
+    def gather_results(self, results, time_course_index=-1):
+        """ gather the results of all outputs into one array, ordered as self.output_ids """
+        try:
+            values = np.array([results[variable_id] for variable_id in self.output_ids])
+        except ValueError:
+            # results of different shapes
+            values = None
+        if values is None or values.dtype == object:
+            return np.array([
+                self.process_result(results[variable_id], time_course_index)
+                for variable_id in self.output_ids
+            ], dtype=object)
+        if self.parameters['simulation'] in TIME_COURSE_SIMULATIONS:
+            return values[:, time_course_index]
         return values
 
-    def next_update(self, interval, state):
+    def process_results(self, results, time_course_index=-1):
+        return dict(zip(
+            self.output_ids,
+            self.gather_results(results, time_course_index)))
 
-        # collect the inputs
+    def collect_inputs(self, state):
+        """ get a {variable_id: value} dict of the inputs from all input ports """
         input_values = {}
         for port_id in self.input_ports:
-            input_values.update(state[port_id])
+            input_values.update(self.get_port_values(port_id, state[port_id]))
+        return input_values
 
-        # run task
-        raw_results = self.run_task(input_values, interval)
+    def solve(self, inputs, interval):
+        """ run the task for interval, and return the gathered results """
+        if self.response_surface is not None:
+            results = self.response_surface.lookup(inputs)
+            if results is not None:
+                return results
+
+        if self.result_cache is not None:
+            key = self.result_cache.make_key(
+                inputs.get(variable_id) for variable_id in self.input_target_map)
+            results = self.result_cache.get(key)
+            if results is not None:
+                return results
+
+        if self.stepper is not None:
+            raw_results = self.step_task(inputs, interval)
+        else:
+            raw_results = self.run_task(inputs, interval)
+        start = self.timer.clock()
+        results = self.gather_results(raw_results)
+        if self.trajectory_port:
+            self.trajectory = self.gather_trajectory(raw_results)
+        if self.result_cache is not None:
+            self.result_cache.set(key, results)
+        self.timer.record('results', start)
+        return results
 
-        # transform results
+    def make_update(self, results, state, interval):
+        """ make the update from the gathered results, with one delta calculation per port """
+        start = self.timer.clock()
         update = {}
+        relative_change = 0.
         for port_id in self.output_ports:
             variable_ids = self.port_assignments[port_id]
-            if variable_ids:
-                update[port_id] = {}
-                for variable_id in variable_ids:
-                    raw_result = raw_results[variable_id]
-                    value = self.process_result(raw_result)
-
-                    # different get_delta for different data types?
-                    update[port_id][variable_id] = get_delta(
-                        state[port_id][variable_id], value)
+            if not variable_ids:
+                continue
+            values = results[self.output_port_positions[port_id]]
+            if port_id in self.array_ports:
+                before = state[port_id]
+                update[port_id] = get_delta(before, values)
+            else:
+                port_state = state[port_id]
+                before = np.array([port_state[variable_id] for variable_id in variable_ids])
+                update[port_id] = dict(zip(variable_ids, get_delta(before, values)))
+            if self.parameters['adaptive_time_step']:
+                relative_change = max(relative_change, get_relative_change(before, values))
+
+        if self.parameters['adaptive_time_step']:
+            self.adapt_time_step(interval, relative_change)
+        self.timer.record('deltas', start)
+        self.add_diagnostics(update)
+        if self.trajectory_port:
+            update[self.trajectory_port] = self.trajectory
         return update
+
+    def get_timings(self):
+        """ get {phase: {'time', 'count', 'mean'}} for the recorded phases, see the 'timing' parameter """
+        return self.timer.get_timings()
+
+    def reset_timings(self):
+        self.timer.reset()
+
+    def add_diagnostics(self, update):
+        if self.diagnostics_port:
+            update[self.diagnostics_port] = self.get_timings()
+
+    def adapt_time_step(self, interval, relative_change):
+        """ scale the next time step by how the relative change over interval compares to the tolerance """
+        max_growth = 2.
+        max_shrink = 0.2
+        if relative_change > 0:
+            # the change over a step is about proportional to the step
+            factor = 0.9 * self.parameters['relative_tolerance'] / relative_change
+            factor = min(max(factor, max_shrink), max_growth)
+        else:
+            factor = max_growth
+        self.time_step = min(max(interval * factor, self.min_time_step), self.max_time_step)
+
+    def calculate_timestep(self, states):
+        if self.parameters['adaptive_time_step']:
+            return self.time_step
+        return super().calculate_timestep(states)
+
+    def send_command(self, command, args=None, kwargs=None, run_pre_check=True):
+        """ send next_update to the worker without waiting, so that other processes can run concurrently """
+        if self.worker is None or command != 'next_update':
+            return super().send_command(command, args, kwargs, run_pre_check)
+        if run_pre_check:
+            self.pre_send_command(command, args, kwargs)
+        interval, state = args
+        self.worker.send_step(self.collect_inputs(state), interval)
+        self._worker_args = (interval, state)
+
+    def get_command_result(self):
+        if self.worker is None or not self.worker.pending:
+            return super().get_command_result()
+        self._pending_command = None
+        interval, state = self._worker_args
+        self._worker_args = None
+        start = self.timer.clock()
+        results = self.worker.get_results()
+        self.timer.record('worker', start)
+        return self.make_update(results, state, interval)
+
+    def end_worker(self):
+        if self.worker is not None:
+            self.worker.end()
+
+    def next_update(self, interval, state):
+        input_values = self.collect_inputs(state)
+        if self.worker is not None:
+            start = self.timer.clock()
+            self.worker.send_step(input_values, interval)
+            results = self.worker.get_results()
+            self.timer.record('worker', start)
+        else:
+            results = self.solve(input_values, interval)
+        return self.make_update(results, state, interval)
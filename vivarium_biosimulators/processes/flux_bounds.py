@@ -3,6 +3,9 @@
 Flux Bounds Converter
 =====================
 """
+import numpy as np
+from pint import DimensionalityError
+
 from vivarium.core.process import Process
 from vivarium.library.units import units
 
@@ -68,6 +71,57 @@ class FluxBoundsConverter(Process):
         self.time_unit = units(self.parameters['time_unit'])
         self.mass = self.parameters['mass'][0] * units(self.parameters['mass'][1])
         self.volume = self.parameters['volume'][0] * units(self.parameters['volume'][1])
+        self.conversion_factor = self.get_conversion_factor()
+
+        # bounds arrays for each ordering of flux ids, see get_bounds_map
+        self.bounds_maps = {}
+
+    def get_conversion_factor(self):
+        """
+        Get the factor that converts a flux over one time unit to the bounds unit.
+        The factor for a time step dt is conversion_factor / dt.
+        """
+        rate_unit = self.flux_unit / self.time_unit
+        try:
+            return (1 * rate_unit).to(self.bounds_unit).magnitude
+        except DimensionalityError:
+            # use mass?
+            return (self.volume / self.mass * rate_unit).to(self.bounds_unit).magnitude
+
+    def get_bounds_map(self, flux_ids):
+        """
+        Get index arrays and bounds ids for converting fluxes, given in the order of flux_ids.
+        Single bounds are set to the flux, and range bounds are set from its range multipliers.
+        """
+        flux_ids = tuple(flux_ids)
+        if flux_ids in self.bounds_maps:
+            return self.bounds_maps[flux_ids]
+
+        single_index, single_ids = [], []
+        range_index, upper_ids, lower_ids, ranges = [], [], [], []
+        for index, flux_id in enumerate(flux_ids):
+            bounds = self.flux_to_bounds_map[flux_id]
+            if isinstance(bounds, dict):
+                range_index.append(index)
+                upper_ids.append(bounds['upper_bound'])
+                lower_ids.append(bounds['lower_bound'])
+                ranges.append(bounds.get('range', self.parameters['default_range']))
+            else:
+                single_index.append(index)
+                single_ids.append(bounds)
+
+        ranges = np.array(ranges, dtype=float).reshape(-1, 2)
+        bounds_map = {
+            'single_index': np.array(single_index, dtype=int),
+            'single_ids': single_ids,
+            'range_index': np.array(range_index, dtype=int),
+            'upper_ids': upper_ids,
+            'lower_ids': lower_ids,
+            'range_low': ranges[:, 0],
+            'range_high': ranges[:, 1],
+        }
+        self.bounds_maps[flux_ids] = bounds_map
+        return bounds_map
 
     def initial_state(self, config=None):
         state = self.ode_process.initial_state(config)
@@ -85,8 +139,9 @@ class FluxBoundsConverter(Process):
         Use the ODE process's ports, with an added 'bounds' port for flux bounds output.
         """
         ports = self.ode_process.get_schema()
-        assert set(ports['fluxes']) <= set(self.flux_ids), f"{list(set(ports['fluxes']) - set(self.flux_ids))} " \
-                                                           f"ode fluxes are not in flux_to_bounds_map"
+        fluxes = self.ode_process.port_assignments['fluxes']
+        assert set(fluxes) <= set(self.flux_ids), f"{list(set(fluxes) - set(self.flux_ids))} " \
+                                                  f"ode fluxes are not in flux_to_bounds_map"
         ports['bounds'] = {
             rxn_id: {}
             for rxn_id in self.bounds_ids
@@ -97,48 +152,55 @@ class FluxBoundsConverter(Process):
         """
         Divide by the time step to get flux bounds, and convert to bounds unit
         """
-        flux_bounds = {}
-        for flux_id, flux_value in fluxes.items():
-            try:
-                flux = (
-                    flux_value / dt * (
-                        self.flux_unit / self.time_unit)
-                ).to(self.bounds_unit).magnitude
-            except:
-                # use mass?
-                flux = (
-                    flux_value * self.volume / self.mass / dt * (
-                        self.flux_unit / self.time_unit)
-                ).to(self.bounds_unit).magnitude
+        bounds_map = self.get_bounds_map(fluxes.keys())
+        flux_values = np.fromiter(fluxes.values(), dtype=float, count=len(fluxes))
+        flux_values *= self.conversion_factor / dt
 
-            bounds = self.flux_to_bounds_map[flux_id]
-            if isinstance(bounds, dict):
-                upper_bound_id = bounds['upper_bound']
-                lower_bound_id = bounds['lower_bound']
-                bounds_range = bounds.get('range', self.parameters['default_range'])
-                bound_values = (flux * bounds_range[0], flux * bounds_range[1])
-                max_flux = max(bound_values)
-                min_flux = min(bound_values)
-                if flux <= 0:
-                    flux_bounds[upper_bound_id] = 0
-                    flux_bounds[lower_bound_id] = min_flux
-                else:
-                    flux_bounds[upper_bound_id] = max_flux
-                    flux_bounds[lower_bound_id] = 0
-                # print(f'BOUNDS: {bound_values}')
-            else:
-                flux_bounds[bounds] = flux
+        flux_bounds = dict(zip(
+            bounds_map['single_ids'],
+            flux_values[bounds_map['single_index']].tolist()))
 
+        # negative fluxes set the lower bound, positive fluxes set the upper bound
+        range_fluxes = flux_values[bounds_map['range_index']]
+        bound_values = (
+            range_fluxes * bounds_map['range_low'],
+            range_fluxes * bounds_map['range_high'])
+        negative = range_fluxes <= 0
+        upper_bounds = np.where(negative, 0., np.maximum(*bound_values))
+        lower_bounds = np.where(negative, np.minimum(*bound_values), 0.)
+        flux_bounds.update(zip(bounds_map['upper_ids'], upper_bounds.tolist()))
+        flux_bounds.update(zip(bounds_map['lower_ids'], lower_bounds.tolist()))
         return flux_bounds
 
+    def send_command(self, command, args=None, kwargs=None, run_pre_check=True):
+        """ send next_update to an ODE process in worker mode without waiting, so that other processes can run """
+        if command != 'next_update' or getattr(self.ode_process, 'worker', None) is None:
+            return super().send_command(command, args, kwargs, run_pre_check)
+        if run_pre_check:
+            self.pre_send_command(command, args, kwargs)
+        self.ode_process.send_command(command, args, kwargs)
+
+    def get_command_result(self):
+        if getattr(self.ode_process, 'worker', None) is None or not self.ode_process.worker.pending:
+            return super().get_command_result()
+        interval = self._pending_command[1][0]
+        self._pending_command = None
+        update = self.ode_process.get_command_result()
+        return self.add_bounds(update, interval)
+
     def next_update(self, interval, states):
         """
         Get the ODE process's update, convert the flux values to bounds,
         add them to the bounds port, and return the full update.
         """
         update = self.ode_process.next_update(interval, states)
-        if update.get('fluxes'):
-            bounds = self.convert_fluxes(update['fluxes'], interval)
+        return self.add_bounds(update, interval)
+
+    def add_bounds(self, update, interval):
+        """ add the bounds from the update's fluxes to the update """
+        if 'fluxes' in update and len(update['fluxes']):
+            fluxes = self.ode_process.get_port_values('fluxes', update['fluxes'])
+            bounds = self.convert_fluxes(fluxes, interval)
             update['bounds'] = {
                 flux_id: {
                     '_value': bound,